@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+from bot.database.main import use_async_orm
+from bot.database.methods.cache import employee_cache
+from bot.database.methods.get import (
+    get_document_details,
+    get_document_photos,
+    get_document_photos_stats,
+    get_employee_by_telegram_id,
+)
+
+
+async def _timed(coro):
+    started = time.perf_counter()
+    await coro
+    return time.perf_counter() - started
+
+
+async def run_round(telegram_id: int, document_number: str, concurrency: int):
+    """
+    Имитация concurrency одновременных callback-запросов
+
+    Каждый "запрос" делает те же чтения, что и экран наряда и согласования.
+    """
+
+    async def callback_query():
+        await get_employee_by_telegram_id(telegram_id)
+        await get_document_details(document_number, telegram_id)
+        await get_document_photos(document_number, "start")
+        await get_document_photos_stats(document_number)
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(
+        *(_timed(callback_query()) for _ in range(concurrency))
+    )
+    total = time.perf_counter() - started
+
+    latencies = sorted(latencies)
+    return {
+        "total": total,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "max": latencies[-1],
+    }
+
+
+async def main(args):
+    # Кэш сотрудников отключаем, чтобы каждый вызов доходил до базы
+    employee_cache.ttl = 0
+
+    for mode in (False, True):
+        use_async_orm(mode)
+        # Прогрев соединения и потоков
+        await run_round(args.telegram_id, args.document, 1)
+        report = await run_round(args.telegram_id, args.document, args.concurrency)
+        print(
+            f"{'async ORM' if mode else 'db_executor':>14}: "
+            f"{args.concurrency} запросов за {report['total']:.3f}с, "
+            f"p50 {report['p50'] * 1000:.1f}мс, "
+            f"p95 {report['p95'] * 1000:.1f}мс, "
+            f"max {report['max'] * 1000:.1f}мс"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Сравнение чтений через db_executor и нативный async ORM"
+    )
+    parser.add_argument("--telegram-id", type=int, required=True)
+    parser.add_argument("--document", required=True, help="номер наряда")
+    parser.add_argument("--concurrency", type=int, default=150)
+    asyncio.run(main(parser.parse_args()))
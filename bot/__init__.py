@@ -1 +1 @@
-from .main import start_bot
\ No newline at end of file
+from .main import start_bot, start_webhook
\ No newline at end of file
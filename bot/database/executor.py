@@ -0,0 +1,184 @@
+from bot.django_setup import *  # настройка Django окружения
+from django.conf import settings
+from django.db import close_old_connections, connections
+from bot.misc import DBConfig
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+def _pool_size():
+    """
+    Размер пула потоков для ORM
+
+    По умолчанию совпадает с максимальным размером пула соединений
+    Django (OPTIONS["pool"]["max_size"]), чтобы потоки не ждали соединения.
+    """
+    if DBConfig.EXECUTOR_WORKERS > 0:
+        return DBConfig.EXECUTOR_WORKERS
+
+    options = settings.DATABASES.get("default", {}).get("OPTIONS", {})
+    pool = options.get("pool")
+    if isinstance(pool, dict) and pool.get("max_size"):
+        return int(pool["max_size"])
+    return 8
+
+
+# Соединения закрываются по возрасту только при конечном CONN_MAX_AGE > 0
+RECYCLE_BY_AGE = bool(settings.DATABASES.get("default", {}).get("CONN_MAX_AGE", 0))
+
+# Нужно ли обслуживать соединения до и после каждой успешной операции
+RECYCLE_EACH_OPERATION = RECYCLE_BY_AGE or not DBConfig.PERSISTENT_CONNECTIONS
+
+
+def recycle_connections(failed=False):
+    """
+    Обслуживание соединений текущего потока между операциями
+
+    По умолчанию соблюдается CONN_MAX_AGE проекта через
+    close_old_connections: при 0 (по умолчанию Django) соединение
+    закрывается после каждой операции. С DBConfig.PERSISTENT_CONNECTIONS
+    соединение остаётся открытым между операциями потока и закрывается
+    только после ошибки (если стало непригодным) и по истечении
+    CONN_MAX_AGE > 0.
+    """
+    if not DBConfig.PERSISTENT_CONNECTIONS:
+        close_old_connections()
+        return
+    if not failed and not RECYCLE_BY_AGE:
+        return
+    for connection in connections.all(initialized_only=True):
+        connection.close_if_unusable_or_obsolete()
+
+
+class DBExecutor:
+    """
+    Пул потоков для синхронного ORM
+
+    Вместо единственного потока sync_to_async(thread_sensitive=True)
+    запросы разных пользователей выполняются параллельно. Соединения
+    потоков обслуживаются recycle_connections; с постоянными соединениями
+    (DB_PERSISTENT_CONNECTIONS) потоков пула должно быть не больше, чем
+    допускает база, а с пулом соединений Django (OPTIONS["pool"]) их
+    число совпадает с max_size.
+
+    Собирает метрики ожидания в очереди (от постановки задачи до начала
+    выполнения) - рост ожидания означает, что пул пора увеличить.
+    """
+
+    def __init__(self, workers=None, slow_wait=DBConfig.SLOW_WAIT_MS / 1000):
+        self.workers = workers
+        self.slow_wait = slow_wait
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _ensure_started(self):
+        """Ленивый запуск пула при первом обращении"""
+        if self._pool is None:
+            self.workers = max(1, self.workers or _pool_size())
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="db"
+            )
+
+    def _record_wait(self, wait):
+        with self._lock:
+            self._calls += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+        if wait >= self.slow_wait:
+            logger.warning("DB executor queue wait %.0fms", wait * 1000)
+
+    def _execute(self, submitted, context, func, args, kwargs):
+        """Выполнение операции в потоке пула"""
+        self._record_wait(time.perf_counter() - submitted)
+
+        recycle_connections()
+        failed = False
+        try:
+            return context.run(func, *args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            recycle_connections(failed)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Выполнить синхронную функцию в пуле и дождаться результата
+
+        Контекстные переменные вызывающей корутины доступны в функции,
+        как и при sync_to_async.
+        """
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool,
+            self._execute,
+            time.perf_counter(),
+            contextvars.copy_context(),
+            func,
+            args,
+            kwargs,
+        )
+
+    def stats(self):
+        """
+        Метрики ожидания в очереди
+
+        Returns:
+            dict: workers, calls, avg_wait и max_wait (секунды)
+        """
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "calls": self._calls,
+                "avg_wait": self._wait_total / self._calls if self._calls else 0.0,
+                "max_wait": self._wait_max,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._calls = 0
+            self._wait_total = 0.0
+            self._wait_max = 0.0
+
+    def shutdown(self):
+        """Остановка пула и закрытие соединений его потоков"""
+        if self._pool is None:
+            return
+
+        # Соединения привязаны к потокам - закрываем их в каждом потоке
+        barrier = threading.Barrier(self.workers)
+
+        def close_connections():
+            try:
+                barrier.wait(timeout=1)
+            except threading.BrokenBarrierError:
+                pass
+            connections.close_all()
+
+        for _ in range(self.workers):
+            self._pool.submit(close_connections)
+        self._pool.shutdown(wait=True)
+        self._pool = None
+
+        stats = self.stats()
+        logger.info(
+            "DB executor: %d calls, avg wait %.1fms, max wait %.1fms",
+            stats["calls"],
+            stats["avg_wait"] * 1000,
+            stats["max_wait"] * 1000,
+        )
+
+
+db_executor = DBExecutor()
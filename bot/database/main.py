@@ -1 +1,101 @@
-# todo: Database engine
+from bot.django_setup import *  # настройка Django окружения
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from functools import wraps
+from bot.misc import DBConfig
+from bot.database.executor import RECYCLE_EACH_OPERATION, db_executor, recycle_connections
+
+
+# Текущий режим операций чтения (см. with_async_read)
+_async_orm = DBConfig.ASYNC_ORM
+
+
+def use_async_orm(enabled: bool = None) -> bool:
+    """
+    Режим операций чтения: нативный async ORM или пул db_executor
+
+    Args:
+        enabled (bool): Новый режим; None - только узнать текущий
+
+    Returns:
+        bool: Включён ли нативный async ORM
+    """
+    global _async_orm
+    if enabled is not None:
+        _async_orm = enabled
+    return _async_orm
+
+
+def unit_of_work(func=None, *, atomic: bool = True):
+    """
+    Декоратор операции с базой данных
+
+    Превращает синхронную функцию, работающую с ORM, в корутину:
+    вся операция выполняется за один переход в поток пула db_executor
+    и (при atomic=True) внутри одного transaction.atomic().
+
+    Пример:
+        @unit_of_work
+        def _close_document(document_number):
+            document = Document.objects.select_for_update().get(...)
+            ...
+
+        await _close_document("123")
+
+    Args:
+        atomic (bool): Выполнять операцию в транзакции
+    """
+
+    def decorator(func):
+        def run(*args, **kwargs):
+            if atomic:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            return func(*args, **kwargs)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await db_executor.run(run, *args, **kwargs)
+
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+# Выполняется в том же потоке (thread_sensitive), что и запросы async ORM
+_recycle_connections = sync_to_async(recycle_connections)
+
+
+def with_async_read(async_impl):
+    """
+    Декоратор операции чтения, у которой есть нативная async-реализация
+
+    Применяется поверх unit_of_work: в режиме use_async_orm() вызывается
+    async_impl (aget, async for), иначе - синхронная операция в потоке.
+
+    Async ORM выполняет запросы в общем потоке asgiref, где соединение
+    не обслуживает db_executor, поэтому соединение обслуживается
+    recycle_connections в том же потоке, как и в потоках пула.
+    """
+
+    def decorator(operation):
+        @wraps(operation)
+        async def wrapper(*args, **kwargs):
+            if _async_orm:
+                if RECYCLE_EACH_OPERATION:
+                    await _recycle_connections()
+                try:
+                    result = await async_impl(*args, **kwargs)
+                except Exception:
+                    await _recycle_connections(failed=True)
+                    raise
+                if RECYCLE_EACH_OPERATION:
+                    await _recycle_connections()
+                return result
+            return await operation(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,107 @@
+from bot.django_setup import *
+from users.models import Employee
+from django.db.models.signals import post_delete, post_save
+from bot.misc import DBConfig
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+
+# Признак отсутствия записи (None - закэшированный "сотрудник не найден")
+MISSING = object()
+
+# Мемо на время обработки одного апдейта (устанавливается middleware)
+_update_memo: ContextVar = ContextVar("employee_update_memo", default=None)
+
+
+class EmployeeCache:
+    """
+    TTL/LRU кэш сотрудников по telegram_id на процесс
+
+    Сбрасывается при авторизации/выходе и по сигналам сохранения
+    Employee. Изменения из других процессов (например, админки)
+    подхватываются по истечении TTL.
+    """
+
+    def __init__(
+        self, ttl=DBConfig.EMPLOYEE_CACHE_TTL, max_size=DBConfig.EMPLOYEE_CACHE_SIZE
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = OrderedDict()
+        # Сигналы Django приходят из потоков пула db_executor
+        self._lock = threading.Lock()
+
+    def get(self, telegram_id):
+        with self._lock:
+            item = self._items.get(telegram_id)
+            if item is None:
+                return MISSING
+            employee, expires = item
+            if expires < time.monotonic():
+                del self._items[telegram_id]
+                return MISSING
+            self._items.move_to_end(telegram_id)
+            return employee
+
+    def set(self, telegram_id, employee):
+        with self._lock:
+            self._items[telegram_id] = (employee, time.monotonic() + self.ttl)
+            self._items.move_to_end(telegram_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, telegram_id):
+        with self._lock:
+            self._items.pop(telegram_id, None)
+
+    def invalidate_employee(self, employee_id):
+        """Сброс всех записей сотрудника (telegram_id мог измениться)"""
+        with self._lock:
+            stale = [
+                telegram_id
+                for telegram_id, (employee, _) in self._items.items()
+                if employee is not None and employee.pk == employee_id
+            ]
+            for telegram_id in stale:
+                del self._items[telegram_id]
+
+
+employee_cache = EmployeeCache()
+
+
+def get_update_memo():
+    """Мемо текущего апдейта или None вне обработки апдейта"""
+    return _update_memo.get()
+
+
+def start_update_memo():
+    return _update_memo.set({})
+
+
+def reset_update_memo(token):
+    _update_memo.reset(token)
+
+
+def invalidate_employee(telegram_id=None, employee_id=None):
+    """Сброс кэша и мемо текущего апдейта для сотрудника"""
+    if telegram_id is not None:
+        employee_cache.invalidate(telegram_id)
+        memo = get_update_memo()
+        if memo is not None:
+            memo.pop(telegram_id, None)
+    if employee_id is not None:
+        employee_cache.invalidate_employee(employee_id)
+
+
+def _on_employee_changed(sender, instance, **kwargs):
+    invalidate_employee(telegram_id=instance.telegram_id, employee_id=instance.pk)
+
+
+post_save.connect(
+    _on_employee_changed, sender=Employee, dispatch_uid="bot_employee_cache_save"
+)
+post_delete.connect(
+    _on_employee_changed, sender=Employee, dispatch_uid="bot_employee_cache_delete"
+)
@@ -6,12 +6,16 @@ from users.models import Employee
 from orders.models import Document, DocumentPhoto
 
 # Django утилиты
-from django.core.files.base import ContentFile
+from django.core.files.base import ContentFile, File
+from django.db import IntegrityError, connections, router, transaction
 from django.db.models import Q
 from django.utils import timezone
 
 # Асинхронный доступ к синхронному ORM
-from asgiref.sync import sync_to_async
+from bot.database.main import unit_of_work
+
+# Таймаут скачивания фото из Telegram
+from bot.misc import SessionConfig
 
 # Типизация
 from typing import List, Dict, Optional
@@ -19,58 +23,310 @@ from typing import List, Dict, Optional
 # Работа с датой
 from datetime import datetime
 
+# Временные файлы при скачивании
+import os
+import tempfile
+
 # Aiogram
 from aiogram import Bot
 
 
-async def save_document_photo(
-    bot: Bot, file_id: str, document_number: str, photo_type: str, telegram_id: int
-):
-    """Сохранение фотографии документа с file_id"""
+# Размер скачиваемого файла, до которого он держится в памяти
+_SPOOL_MAX_SIZE = 1024 * 1024
+
+
+# Дедупликация по file_unique_id (стабилен между ботами и сессиями) требует
+# уникального поля в модели DocumentPhoto; без него - по file_id
+_HAS_FILE_UNIQUE_ID = any(
+    field.name == "file_unique_id" for field in DocumentPhoto._meta.get_fields()
+)
+
+
+def _reserve_storage_name(photo: DocumentPhoto, filename: str):
+    """
+    Занять имя файла в локальном хранилище
+
+    Returns:
+        tuple: (имя в хранилище, путь на диске) или (None, None),
+               если хранилище не локальное
+    """
+    storage = photo.photo.storage
     try:
-        # Проверяем, не сохранена ли уже эта фотография
-        existing_photo = await sync_to_async(
-            DocumentPhoto.objects.filter(file_id=file_id).exists
-        )()
-        if existing_photo:
-            return {"success": False, "error": "Фотография уже была загружена"}
+        storage.path(filename)
+    except NotImplementedError:
+        return None, None
 
-        # Получаем файл от Telegram
-        file = await bot.get_file(file_id)
-        file_path = file.file_path
+    # Пустой файл атомарно резервирует уникальное имя под скачивание
+    name = storage.save(
+        photo.photo.field.generate_filename(photo, filename), ContentFile(b"")
+    )
+    return name, storage.path(name)
 
-        # Скачиваем файл
-        file_content = await bot.download_file(file_path)
 
-        # Прочитать файл СИНХРОННО
-        content = await sync_to_async(file_content.read)()
+def _insert_each(claimed):
+    """
+    Вставка фото по одному, каждое в своей точке сохранения
 
-        # Находим документ и сотрудника
-        document = await sync_to_async(Document.objects.get)(
-            document_number=document_number
-        )
-        employee = await sync_to_async(Employee.objects.get)(telegram_id=telegram_id)
+    Returns:
+        list: (фото, имя, путь) для вставленных записей; резерв имени
+              фото, уже записанного параллельной загрузкой, освобождается
+    """
+    inserted = []
+    for photo, name, path in claimed:
+        try:
+            with transaction.atomic():
+                photo.save(force_insert=True)
+        except IntegrityError:
+            # Конфликт: фото уже загружено - резерв имени не нужен
+            if name is not None:
+                photo.photo.storage.delete(name)
+            continue
+        inserted.append((photo, name, path))
+    return inserted
 
-        # Создаем уникальное имя файла
-        file_extension = file_path.split(".")[-1] if "." in file_path else "jpg"
-        filename = f"{document_number}_{photo_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_extension}"
 
-        # Создаем объект DocumentPhoto
+@unit_of_work
+def _claim_document_photos(
+    photos: List[tuple],
+    document_number: str,
+    photo_type: str,
+    telegram_id: int,
+    file_extension: str,
+):
+    """
+    Запись нескольких фото (альбома) одним INSERT
+
+    Уже загруженные фото отсекает уникальное ограничение file_unique_id,
+    без предварительной проверки: при конфликте альбом вставляется по
+    одному фото, и своими считаются только записи, чей INSERT прошёл.
+
+    Без поля file_unique_id ограничения нет, и повторы по file_id
+    отсекаются запросом перед INSERT. Такая проверка не защищает от
+    параллельной загрузки того же фото между запросом и INSERT.
+
+    Args:
+        photos (list): Пары (file_id, file_unique_id)
+
+    Returns:
+        list: (фото, имя в хранилище, путь на диске) для новых фото;
+              уже загруженные пропускаются
+    """
+    document = Document.objects.get(document_number=document_number)
+    employee = Employee.objects.get(telegram_id=telegram_id)
+
+    # Ключ дедупликации; повтор внутри самого альбома отсекаем сразу
+    unique = {}
+    for file_id, file_unique_id in photos:
+        key = (file_unique_id if _HAS_FILE_UNIQUE_ID else None) or file_id
+        unique.setdefault(key, (file_id, file_unique_id))
+
+    if not _HAS_FILE_UNIQUE_ID:
+        # Ограничения нет - проверка запросом (возможна гонка, см. выше)
+        existing = DocumentPhoto.objects.filter(file_id__in=list(unique))
+        for key in existing.values_list("file_id", flat=True):
+            unique.pop(key, None)
+
+    claimed = []
+    for file_id, file_unique_id in unique.values():
         photo = DocumentPhoto(
             document=document,
             photo_type=photo_type,
             uploaded_by=employee,
-            file_id=file_id,  # Сохраняем file_id
+            file_id=file_id,
+        )
+        if _HAS_FILE_UNIQUE_ID and file_unique_id:
+            photo.file_unique_id = file_unique_id
+
+        name, path = _reserve_storage_name(
+            photo, _photo_filename(document_number, photo_type, file_extension)
         )
+        if name is not None:
+            photo.photo.name = name
+        claimed.append((photo, name, path))
 
-        # Сохраняем файл (это строго синхронно)
-        await sync_to_async(photo.photo.save)(filename, ContentFile(content), save=True)
+    # Без ignore_conflicts INSERT возвращает id каждой записи, поэтому
+    # запись заведомо создана этим вызовом, а не параллельной загрузкой
+    can_return_ids = connections[
+        router.db_for_write(DocumentPhoto)
+    ].features.can_return_rows_from_bulk_insert
+    try:
+        if not can_return_ids:
+            return _insert_each(claimed)
+        try:
+            with transaction.atomic():
+                DocumentPhoto.objects.bulk_create([photo for photo, _, _ in claimed])
+        except IntegrityError:
+            return _insert_each(claimed)
+        return claimed
+    except Exception:
+        for photo, name, _ in claimed:
+            if name is not None:
+                photo.photo.storage.delete(name)
+        raise
 
-        return {"success": True, "photo_id": photo.id, "filename": filename}
+
+@unit_of_work
+def _store_photo_file(photo: DocumentPhoto, filename: str, content):
+    # Хранилище само читает файл блоками
+    photo.photo.save(filename, File(content), save=True)
+
+
+@unit_of_work
+def _release_document_photo(photo: DocumentPhoto):
+    """Откат записи, если файл не удалось получить"""
+    if photo.photo:
+        photo.photo.delete(save=False)
+    photo.delete()
+
+
+def _photo_filename(document_number: str, photo_type: str, file_extension: str):
+    # Создаем уникальное имя файла
+    return f"{document_number}_{photo_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_extension}"
+
+
+async def register_document_photos(
+    photos: List[tuple],
+    document_number: str,
+    photo_type: str,
+    telegram_id: int,
+    file_extension: str = "jpg",
+):
+    """
+    Регистрация альбома фотографий одной транзакцией
+
+    Args:
+        photos (list): Пары (file_id, file_unique_id)
+
+    Returns:
+        Dict: success, photos (dict с photo, filename, storage_path),
+              duplicates или error
+    """
+    try:
+        claimed = await _claim_document_photos(
+            photos, document_number, photo_type, telegram_id, file_extension
+        )
+        return {
+            "success": True,
+            "photos": [
+                {
+                    "photo": photo,
+                    "filename": (
+                        os.path.basename(name)
+                        if name
+                        else _photo_filename(document_number, photo_type, file_extension)
+                    ),
+                    "storage_path": path,
+                }
+                for photo, name, path in claimed
+            ],
+            "duplicates": len(photos) - len(claimed),
+        }
 
     except Document.DoesNotExist:
         return {"success": False, "error": f"Документ {document_number} не найден"}
     except Employee.DoesNotExist:
         return {"success": False, "error": "Сотрудник не найден"}
+    except IntegrityError:
+        return {"success": False, "error": "Фотография уже была загружена"}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+async def store_document_photo_file(
+    bot: Bot,
+    photo: DocumentPhoto,
+    filename: str,
+    storage_path: Optional[str],
+    file_path: Optional[str] = None,
+    keep_content: bool = False,
+):
+    """
+    Скачивание файла зарегистрированной фотографии из Telegram
+
+    Исключения не перехватываются - решение о повторе принимает
+    вызывающий код.
+
+    Args:
+        keep_content (bool): Вернуть байты фото при удалённом хранилище
+                             (для анализа без повторного скачивания)
+
+    Returns:
+        Путь к сохранённому файлу в локальном хранилище, байты фото
+        при keep_content или None
+    """
+    if file_path is None:
+        file_path = (await bot.get_file(photo.file_id)).file_path
+
+    if storage_path is not None:
+        # Локальное хранилище: поток из Telegram пишется прямо в файл
+        await bot.download_file(
+            file_path, destination=storage_path, timeout=SessionConfig.DOWNLOAD_TIMEOUT
+        )
+        return storage_path
+
+    # Удалённое хранилище: большой файл уходит на диск, а не в память
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE) as content:
+        await bot.download_file(
+            file_path, destination=content, timeout=SessionConfig.DOWNLOAD_TIMEOUT
+        )
+        await _store_photo_file(photo, filename, content)
+        if keep_content:
+            content.seek(0)
+            return content.read()
+    return None
+
+
+async def discard_document_photo(photo: DocumentPhoto):
+    """Удаление фотографии, файл которой так и не удалось сохранить"""
+    await _release_document_photo(photo)
+
+
+async def save_document_photo(
+    bot: Bot,
+    file_id: str,
+    document_number: str,
+    photo_type: str,
+    telegram_id: int,
+    file_unique_id: Optional[str] = None,
+):
+    """Сохранение фотографии документа с file_id"""
+    try:
+        # Получаем файл от Telegram
+        file = await bot.get_file(file_id)
+        file_path = file.file_path
+        file_extension = file_path.split(".")[-1] if "." in file_path else "jpg"
+
+        result = await register_document_photos(
+            [(file_id, file_unique_id or file.file_unique_id)],
+            document_number,
+            photo_type,
+            telegram_id,
+            file_extension=file_extension,
+        )
+        if not result["success"]:
+            return result
+        if not result["photos"]:
+            return {"success": False, "error": "Фотография уже была загружена"}
+
+        registered = result["photos"][0]
+        photo = registered["photo"]
+        try:
+            await store_document_photo_file(
+                bot,
+                photo,
+                registered["filename"],
+                registered["storage_path"],
+                file_path,
+            )
+        except BaseException:
+            await discard_document_photo(photo)
+            raise
+
+        return {
+            "success": True,
+            "photo_id": photo.id,
+            "filename": registered["filename"],
+        }
+
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -1,39 +1,84 @@
 from bot.django_setup import *
 from users.models import Employee
 from orders.models import Document, DocumentPhoto
-from asgiref.sync import sync_to_async
-from django.db.models import Q
+from django.db.models import Count, Q
 from typing import List, Dict, Optional
 from datetime import datetime
+from bot.database.main import unit_of_work, with_async_read
+from .cache import MISSING, employee_cache, get_update_memo, invalidate_employee
+import logging
+
+
+logger = logging.getLogger(__name__)
 
 
 # Вспомогательные функции
-async def get_employee_by_telegram_id(telegram_id: int):
-    """Получить сотрудника по Telegram ID"""
+async def _aload_employee(telegram_id: int):
     try:
-        return await sync_to_async(Employee.objects.get)(telegram_id=telegram_id)
+        return await Employee.objects.aget(telegram_id=telegram_id)
     except Employee.DoesNotExist:
         return None
 
 
-async def authorize_user_by_uuid(uuid_token: str, telegram_id: int):
-    """Авторизация по UUID"""
+@with_async_read(_aload_employee)
+@unit_of_work(atomic=False)
+def _load_employee(telegram_id: int):
     try:
-        # Ищем сотрудника по UUID
-        employee = await sync_to_async(Employee.objects.get)(id=uuid_token)
+        return Employee.objects.get(telegram_id=telegram_id)
+    except Employee.DoesNotExist:
+        return None
 
-        # Проверяем, не привязан ли уже к другому Telegram
-        if employee.telegram_id and employee.telegram_id != telegram_id:
-            return {
-                "success": False,
-                "error": "Этот токен уже привязан к другому Telegram аккаунту.",
-            }
 
-        # Привязываем Telegram ID к сотруднику
-        employee.telegram_id = telegram_id
-        await sync_to_async(employee.save)()
+async def get_employee_by_telegram_id(telegram_id: int):
+    """
+    Получить сотрудника по Telegram ID
+
+    Сначала смотрит мемо текущего апдейта, затем кэш процесса,
+    и только потом обращается к базе.
+    """
+    memo = get_update_memo()
+    if memo is not None and telegram_id in memo:
+        return memo[telegram_id]
+
+    employee = employee_cache.get(telegram_id)
+    if employee is MISSING:
+        employee = await _load_employee(telegram_id)
+        employee_cache.set(telegram_id, employee)
+
+    if memo is not None:
+        memo[telegram_id] = employee
+    return employee
+
+
+@unit_of_work
+def _bind_telegram_id(uuid_token: str, telegram_id: int) -> Dict:
+    # Ищем сотрудника по UUID
+    employee = Employee.objects.select_for_update().get(id=uuid_token)
+
+    # Проверяем, не привязан ли уже к другому Telegram
+    if employee.telegram_id and employee.telegram_id != telegram_id:
+        return {
+            "success": False,
+            "error": "Этот токен уже привязан к другому Telegram аккаунту.",
+        }
+
+    # Привязываем Telegram ID к сотруднику
+    employee.telegram_id = telegram_id
+    employee.save()
+
+    return {"success": True, "employee": employee}
+
+
+async def authorize_user_by_uuid(uuid_token: str, telegram_id: int):
+    """Авторизация по UUID"""
+    try:
+        result = await _bind_telegram_id(uuid_token, telegram_id)
+        if result["success"]:
+            invalidate_employee(
+                telegram_id=telegram_id, employee_id=result["employee"].pk
+            )
 
-        return {"success": True, "employee": employee}
+        return result
 
     except Employee.DoesNotExist:
         return {"success": False, "error": "Неверный токен доступа."}
@@ -41,12 +86,19 @@ async def authorize_user_by_uuid(uuid_token: str, telegram_id: int):
         return {"success": False, "error": f"Ошибка авторизации: {str(e)}"}
 
 
+@unit_of_work
+def _unbind_telegram_id(telegram_id: int):
+    employee = Employee.objects.select_for_update().get(telegram_id=telegram_id)
+    employee.telegram_id = None
+    employee.save()
+    return employee
+
+
 async def logout_user(telegram_id: int):
     """Выход из системы"""
     try:
-        employee = await sync_to_async(Employee.objects.get)(telegram_id=telegram_id)
-        employee.telegram_id = None
-        await sync_to_async(employee.save)()
+        employee = await _unbind_telegram_id(telegram_id)
+        invalidate_employee(telegram_id=telegram_id, employee_id=employee.pk)
         return True
     except Employee.DoesNotExist:
         return False
@@ -54,6 +106,62 @@ async def logout_user(telegram_id: int):
         return False
 
 
+@unit_of_work(atomic=False)
+def _collect_active_documents(employee) -> List[Dict]:
+    """Синхронная выборка действующих нарядов сотрудника (один поток, 2 запроса)"""
+    # Получаем все документы где пользователь является supervisor или executor
+    # и статус документа "pending" (действующие)
+    documents = (
+        Document.objects.filter(
+            (
+                Q(supervisor=employee)  # Руководитель работ
+                | Q(executor=employee)  # Производитель работ
+            )
+        )
+        .distinct()
+        .select_related("supervisor", "approver", "executor", "observer")
+        .prefetch_related("crew_members")
+    )
+
+    # Формируем детальную информацию о документах
+    documents_data = []
+    for doc in documents:
+        # Определяем роль пользователя в документе (только supervisor и executor)
+        user_roles = []
+        if doc.supervisor_id == employee.id:
+            user_roles.append("Руководитель работ")
+        if doc.executor_id == employee.id:
+            user_roles.append("Производитель работ")
+
+        # Список членов бригады берётся из prefetch-кэша, без запросов
+        crew_names = [member.full_name for member in doc.crew_members.all()]
+
+        doc_data = {
+            "id": doc.id,
+            "document_number": doc.document_number,
+            "branch": doc.get_branch_display(),
+            "department": doc.get_department_display(),
+            "work_type": doc.get_work_type_display(),
+            "task_description": doc.task_description,
+            "start_datetime": doc.start_datetime.strftime("%d.%m.%Y %H:%M"),
+            "end_datetime": doc.end_datetime.strftime("%d.%m.%Y %H:%M"),
+            "status": doc.get_status_display(),
+            "created": doc.created.strftime("%d.%m.%Y %H:%M"),
+            "user_roles": user_roles,  # Роли текущего пользователя
+            "participants": {
+                "supervisor": doc.supervisor.full_name if doc.supervisor else None,
+                "approver": doc.approver.full_name if doc.approver else None,
+                "executor": doc.executor.full_name if doc.executor else None,
+                "observer": doc.observer.full_name if doc.observer else None,
+                "crew_members": crew_names,
+            },
+            "file_exists": bool(doc.file),
+        }
+        documents_data.append(doc_data)
+
+    return documents_data
+
+
 async def get_user_active_documents(telegram_id: int) -> Dict:
     """
     Получить все действующие наряды пользователя по его Telegram ID
@@ -75,58 +183,9 @@ async def get_user_active_documents(telegram_id: int) -> Dict:
                 "documents": [],
             }
 
-        # Получаем все документы где пользователь является supervisor или executor
-        # и статус документа "pending" (действующие)
-        documents = await sync_to_async(list)(
-            Document.objects.filter(
-                (
-                    Q(supervisor=employee)  # Руководитель работ
-                    | Q(executor=employee)  # Производитель работ
-                )
-            )
-            .distinct()
-            .select_related("supervisor", "approver", "executor", "observer")
-            .prefetch_related("crew_members")
-        )
-
-        # Формируем детальную информацию о документах
-        documents_data = []
-        for doc in documents:
-            # Определяем роль пользователя в документе (только supervisor и executor)
-            user_roles = []
-            if doc.supervisor_id == employee.id:
-                user_roles.append("Руководитель работ")
-            if doc.executor_id == employee.id:
-                user_roles.append("Производитель работ")
-
-            # Получаем список всех участников для отображения
-            crew_members = await sync_to_async(list)(doc.crew_members.all())
-
-            # Получаем список всех участников
-            crew_names = [member.full_name for member in crew_members]
-
-            doc_data = {
-                "id": doc.id,
-                "document_number": doc.document_number,
-                "branch": doc.get_branch_display(),
-                "department": doc.get_department_display(),
-                "work_type": doc.get_work_type_display(),
-                "task_description": doc.task_description,
-                "start_datetime": doc.start_datetime.strftime("%d.%m.%Y %H:%M"),
-                "end_datetime": doc.end_datetime.strftime("%d.%m.%Y %H:%M"),
-                "status": doc.get_status_display(),
-                "created": doc.created.strftime("%d.%m.%Y %H:%M"),
-                "user_roles": user_roles,  # Роли текущего пользователя
-                "participants": {
-                    "supervisor": doc.supervisor.full_name if doc.supervisor else None,
-                    "approver": doc.approver.full_name if doc.approver else None,
-                    "executor": doc.executor.full_name if doc.executor else None,
-                    "observer": doc.observer.full_name if doc.observer else None,
-                    "crew_members": crew_names,
-                },
-                "file_exists": bool(doc.file),
-            }
-            documents_data.append(doc_data)
+        # Документы, участники и члены бригады материализуются за один
+        # переход в поток и фиксированное число запросов (документы + бригады)
+        documents_data = await _collect_active_documents(employee)
 
         return {
             "success": True,
@@ -143,6 +202,11 @@ async def get_user_active_documents(telegram_id: int) -> Dict:
         }
 
 
+@unit_of_work(atomic=False)
+def _list_documents(condition: Q) -> list:
+    return list(Document.objects.filter(condition).distinct())
+
+
 async def get_user_documents_by_role(telegram_id: int, role: str) -> Dict:
     """
     Получить действующие наряды пользователя по конкретной роли
@@ -177,9 +241,7 @@ async def get_user_documents_by_role(telegram_id: int, role: str) -> Dict:
                 "documents": [],
             }
 
-        documents = await sync_to_async(list)(
-            Document.objects.filter(filter_map[role]).distinct()
-        )
+        documents = await _list_documents(filter_map[role])
 
         documents_data = []
         for doc in documents:
@@ -208,6 +270,26 @@ async def get_user_documents_by_role(telegram_id: int, role: str) -> Dict:
         }
 
 
+async def _aload_document_with_crew(document_number: str):
+    document = await Document.objects.select_related(
+        "supervisor", "approver", "executor", "observer"
+    ).aget(document_number=document_number)
+    return document, [member async for member in document.crew_members.all()]
+
+
+@with_async_read(_aload_document_with_crew)
+@unit_of_work(atomic=False)
+def _load_document_with_crew(document_number: str):
+    document = (
+        Document.objects.select_related(
+            "supervisor", "approver", "executor", "observer"
+        )
+        .prefetch_related("crew_members")
+        .get(document_number=document_number)
+    )
+    return document, list(document.crew_members.all())
+
+
 async def get_document_details(document_number: str, telegram_id: int) -> Dict:
     """
     Получить детальную информацию о конкретном наряде
@@ -224,18 +306,11 @@ async def get_document_details(document_number: str, telegram_id: int) -> Dict:
         if not employee:
             return {"success": False, "error": "Пользователь не найден."}
 
-        # Получаем документ
-        document = await sync_to_async(
-            Document.objects.select_related(
-                "supervisor", "approver", "executor", "observer"
-            )
-            .prefetch_related("crew_members")
-            .get
-        )(document_number=document_number)
+        # Получаем документ вместе с членами бригады
+        document, crew_members = await _load_document_with_crew(document_number)
 
         # Проверяем, имеет ли пользователь доступ к этому документу
         # Право просмотра только у supervisor и executor
-        crew_members = await sync_to_async(list)(document.crew_members.all())
         has_access = (
             document.supervisor_id == employee.id or document.executor_id == employee.id
         )
@@ -307,68 +382,194 @@ async def get_document_details(document_number: str, telegram_id: int) -> Dict:
         }
 
 
-async def get_document_photos(document_number: str, photo_type: str):
-    """Получить фотографии документа по типу"""
-    try:
-        # Получаем документ
-        document = await sync_to_async(Document.objects.get)(
-            document_number=document_number
+# file_unique_id отдаётся вместе с file_id, если поле уже есть в модели
+# (см. _HAS_FILE_UNIQUE_ID в create.py): кэш анализа находится по нему
+# без запроса getFile к Telegram
+_PHOTO_VALUES = tuple(
+    name
+    for name in ("file_id", "file_unique_id")
+    if name in {field.name for field in DocumentPhoto._meta.get_fields()}
+)
+
+
+def _photo_file_ids_query(document_number: str, photo_type: str):
+    # Чтобы запрос не сканировал все фото документа, модели DocumentPhoto
+    # во внешнем проекте нужен составной индекс (и миграция там же):
+    #     indexes = [models.Index(fields=["document", "photo_type", "created"])]
+    return (
+        DocumentPhoto.objects.filter(
+            document__document_number=document_number,
+            photo_type=photo_type,
+            file_id__isnull=False,
         )
+        .order_by("created")
+        .values(*_PHOTO_VALUES)
+    )
 
-        # Получаем фотографии нужного типа
-        photos = await sync_to_async(list)(
-            DocumentPhoto.objects.filter(
-                document=document, photo_type=photo_type
-            ).order_by("created")
-        )
 
-        # Возвращаем список с file_id из поля file_id, а не из photo.name
-        photo_list = []
-        for photo in photos:
-            if photo.file_id:  # Проверяем, что file_id существует
-                photo_list.append({"file_id": photo.file_id})
-            else:
-                # Если file_id отсутствует, можно попробовать использовать путь к файлу
-                # Но это будет работать только если файл доступен по URL
-                print(f"Warning: photo {photo.id} has no file_id")
-        
-        return photo_list
+async def _alist_photo_file_ids(document_number: str, photo_type: str) -> list:
+    return [row async for row in _photo_file_ids_query(document_number, photo_type)]
+
+
+@with_async_read(_alist_photo_file_ids)
+@unit_of_work(atomic=False)
+def _list_photo_file_ids(document_number: str, photo_type: str) -> list:
+    return list(_photo_file_ids_query(document_number, photo_type))
+
+
+async def get_document_photos(document_number: str, photo_type: str):
+    """
+    Получить фотографии документа по типу
+
+    Один запрос без загрузки документа и объектов фото: только file_id
+    (и file_unique_id, если поле есть) в порядке загрузки. Фото без
+    file_id отбрасываются в самом запросе.
+    """
+    try:
+        rows = await _list_photo_file_ids(document_number, photo_type)
+        return [
+            {"file_id": row["file_id"], "file_unique_id": row.get("file_unique_id")}
+            for row in rows
+            if row["file_id"]
+        ]
 
     except Exception as e:
         print(f"Ошибка получения фотографий: {e}")
         return []
 
+
 # Дополнительные утилиты для работы с file_id
-async def get_photo_by_file_id(file_id: str) -> Optional[DocumentPhoto]:
-    """Получить фото по file_id"""
+@unit_of_work(atomic=False)
+def _load_photo_by_file_id(file_id: str) -> Optional[DocumentPhoto]:
     try:
-        return await sync_to_async(DocumentPhoto.objects.get)(file_id=file_id)
+        return DocumentPhoto.objects.get(file_id=file_id)
     except DocumentPhoto.DoesNotExist:
         return None
 
 
-async def get_document_photos_stats(document_number: str) -> Dict:
-    """Получить статистику по фотографиям документа"""
+async def get_photo_by_file_id(file_id: str) -> Optional[DocumentPhoto]:
+    """Получить фото по file_id"""
+    return await _load_photo_by_file_id(file_id)
+
+
+# Результат анализа СИЗ хранится в записи фото и виден всем репликам.
+# Требует полей модели DocumentPhoto во внешнем проекте:
+#     ppe_result = models.JSONField(null=True, blank=True)
+#     ppe_image = models.FileField(upload_to="ppe_results/", null=True, blank=True)
+# До миграции результаты живут только в локальном кэше процесса
+HAS_PPE_RESULT = {"ppe_result", "ppe_image"} <= {
+    field.name for field in DocumentPhoto._meta.get_fields()
+}
+
+
+def _read_ppe_result(photo: DocumentPhoto) -> Optional[Dict]:
+    result = photo.ppe_result
+    image = None
+    if not result.get("result_file_id"):
+        # Размеченное фото ещё не отправлялось - берём его из хранилища
+        if not photo.ppe_image:
+            return None
+        try:
+            with photo.ppe_image.open("rb") as file:
+                image = file.read()
+        except OSError:
+            return None
+
+    return {
+        "file_unique_id": result.get("file_unique_id"),
+        "detections": result["detections"],
+        "analysis": result["analysis"],
+        "image": image,
+        "result_file_id": result.get("result_file_id"),
+    }
+
+
+@unit_of_work(atomic=False)
+def _load_ppe_results(file_ids: list, model_version: str, threshold: float) -> Dict:
+    photos = DocumentPhoto.objects.filter(
+        file_id__in=file_ids, ppe_result__isnull=False
+    ).only("file_id", "ppe_result", "ppe_image")
+
+    results = {}
+    for photo in photos:
+        result = photo.ppe_result
+        # Результат другой модели или порога не выдаётся
+        if (
+            result.get("model_version") != model_version
+            or result.get("threshold") != threshold
+        ):
+            continue
+        loaded = _read_ppe_result(photo)
+        if loaded is not None:
+            results[photo.file_id] = loaded
+    return results
+
+
+async def get_ppe_results(
+    file_ids: list, model_version: str, threshold: float
+) -> Dict[str, Dict]:
+    """
+    Сохранённые результаты анализа СИЗ для фотографий одним запросом
+
+    Returns:
+        dict: file_id -> file_unique_id, detections, analysis, image,
+              result_file_id (как у кэша анализа); фото без результата
+              для этой версии модели и порога не попадают
+    """
+    if not HAS_PPE_RESULT or not file_ids:
+        return {}
     try:
-        document = await sync_to_async(Document.objects.get)(
-            document_number=document_number
-        )
+        return await _load_ppe_results(file_ids, model_version, threshold)
+    except Exception:
+        logger.exception("Loading stored PPE results failed")
+        return {}
 
-        photos = await sync_to_async(list)(
-            DocumentPhoto.objects.filter(document=document).values(
-                "photo_type", "created", "uploaded_by__name"
-            )
-        )
 
-        start_photos = [p for p in photos if p["photo_type"] == "start"]
-        completion_photos = [p for p in photos if p["photo_type"] == "completion"]
+def _photo_counts_query(document_number: str):
+    # Один сгруппированный COUNT по типу фото, документ - через JOIN
+    return (
+        DocumentPhoto.objects.filter(document__document_number=document_number)
+        .values("photo_type")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+
+
+async def _acount_photos_by_type(document_number: str) -> Dict[str, int]:
+    return {
+        row["photo_type"]: row["count"]
+        async for row in _photo_counts_query(document_number)
+    }
+
+
+@with_async_read(_acount_photos_by_type)
+@unit_of_work(atomic=False)
+def _count_photos_by_type(document_number: str) -> Dict[str, int]:
+    return {
+        row["photo_type"]: row["count"] for row in _photo_counts_query(document_number)
+    }
+
+
+async def get_document_photos_stats(document_number: str) -> Dict:
+    """
+    Получить статистику по фотографиям документа
+
+    Один запрос, возвращающий по строке на тип фото, сколько бы
+    фотографий ни накопилось. Для несуществующего документа все
+    счётчики равны нулю.
+    """
+    try:
+        counts = await _count_photos_by_type(document_number)
+
+        start_count = counts.get("start", 0)
+        completion_count = counts.get("completion", 0)
 
         return {
-            "total": len(photos),
-            "start_count": len(start_photos),
-            "completion_count": len(completion_photos),
-            "has_start_photos": len(start_photos) > 0,
-            "has_completion_photos": len(completion_photos) > 0,
+            "total": sum(counts.values()),
+            "start_count": start_count,
+            "completion_count": completion_count,
+            "has_start_photos": start_count > 0,
+            "has_completion_photos": completion_count > 0,
         }
-    except Document.DoesNotExist:
-        return {"error": "Документ не найден"}
+    except Exception as e:
+        return {"error": f"Ошибка получения статистики фотографий: {str(e)}"}
@@ -1,11 +1,60 @@
 from bot.django_setup import *
 from users.models import Employee
-from orders.models import Document
-from asgiref.sync import sync_to_async
+from orders.models import Document, DocumentPhoto
+from django.core.files.base import ContentFile
 from django.db.models import Q
 from typing import List, Dict, Optional
 from datetime import datetime
 from django.utils import timezone
+from bot.database.main import unit_of_work
+from .get import HAS_PPE_RESULT
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+@unit_of_work
+def _apply_work_status(
+    document_number: str,
+    new_status: str,
+    telegram_id: int,
+    actual_start_time: bool,
+    actual_end_time: bool,
+):
+    # Блокируем документ до конца транзакции, чтобы параллельные
+    # согласования не перезаписали статус друг друга
+    document = Document.objects.select_for_update().get(
+        document_number=document_number
+    )
+
+    employee = Employee.objects.get(telegram_id=telegram_id)
+
+    # Проверка прав - сравниваем по ID, чтобы избежать дополнительных запросов
+    if (
+        new_status in ["pending_start", "pending_completion"]
+        and document.executor_id != employee.id
+    ):
+        return {"success": False, "error": "Нет прав для изменения статуса"}
+
+    if (
+        new_status in ["in_progress", "completed"]
+        and document.supervisor_id != employee.id
+    ):
+        return {"success": False, "error": "Нет прав для согласования"}
+
+    # Обновляем поля документа
+    if actual_start_time:
+        document.actual_start_datetime = timezone.now()
+
+    if actual_end_time:
+        document.actual_end_datetime = timezone.now()
+
+    document.status = new_status
+
+    document.save()
+
+    return {"success": True}
 
 
 async def update_work_status(
@@ -17,43 +66,100 @@ async def update_work_status(
 ):
     """Обновление статуса работ"""
     try:
-        # Получаем документ с предзагрузкой связанных объектов
-        document = await sync_to_async(
-            Document.objects.select_related("executor", "supervisor").get
-        )(document_number=document_number)
+        # Вся операция - один переход в поток и одна транзакция
+        return await _apply_work_status(
+            document_number,
+            new_status,
+            telegram_id,
+            actual_start_time,
+            actual_end_time,
+        )
+
+    except Document.DoesNotExist:
+        return {"success": False, "error": "Документ не найден"}
+    except Employee.DoesNotExist:
+        return {"success": False, "error": "Сотрудник не найден"}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
 
-        employee = await sync_to_async(Employee.objects.get)(telegram_id=telegram_id)
 
-        # Проверка прав - сравниваем по ID, чтобы избежать дополнительных запросов
-        if (
-            new_status in ["pending_start", "pending_completion"]
-            and document.executor_id != employee.id
-        ):
-            return {"success": False, "error": "Нет прав для изменения статуса"}
+@unit_of_work
+def _store_ppe_result(file_id: str, result: Dict, image: Optional[bytes]):
+    for photo in DocumentPhoto.objects.select_for_update().filter(file_id=file_id):
+        if photo.ppe_image:
+            photo.ppe_image.delete(save=False)
+        if image is not None:
+            photo.ppe_image.save(f"{photo.pk}_ppe.jpg", ContentFile(image), save=False)
+        photo.ppe_result = result
+        photo.save(update_fields=["ppe_result", "ppe_image"])
 
+
+@unit_of_work
+def _store_ppe_result_file_id(
+    file_id: str, model_version: str, threshold: float, result_file_id: str
+):
+    photos = DocumentPhoto.objects.select_for_update().filter(
+        file_id=file_id, ppe_result__isnull=False
+    )
+    for photo in photos:
+        result = photo.ppe_result
         if (
-            new_status in ["in_progress", "completed"]
-            and document.supervisor_id != employee.id
+            result.get("model_version") == model_version
+            and result.get("threshold") == threshold
         ):
-            return {"success": False, "error": "Нет прав для согласования"}
+            photo.ppe_result = {**result, "result_file_id": result_file_id}
+            photo.save(update_fields=["ppe_result"])
 
-        # Обновляем поля документа
-        if actual_start_time:
-            document.actual_start_datetime = timezone.now()
 
-        if actual_end_time:
-            document.actual_end_datetime = timezone.now()
+async def save_ppe_result(
+    file_id: str,
+    file_unique_id: Optional[str],
+    model_version: str,
+    threshold: float,
+    detections: List,
+    analysis: Dict,
+    image: Optional[bytes],
+) -> bool:
+    """
+    Сохранение результата анализа СИЗ в записи фотографии
 
-        document.status = new_status
+    Args:
+        detections, analysis: Значения, пригодные для JSON
+        image (bytes): Размеченное фото в JPEG
 
-        # Сохраняем документ асинхронно
-        await sync_to_async(document.save)()
+    Returns:
+        bool: Сохранён ли результат (False до миграции полей ppe_result)
+    """
+    if not HAS_PPE_RESULT:
+        return False
+    try:
+        await _store_ppe_result(
+            file_id,
+            {
+                "file_unique_id": file_unique_id,
+                "model_version": model_version,
+                "threshold": threshold,
+                "detections": detections,
+                "analysis": analysis,
+                "result_file_id": None,
+            },
+            image,
+        )
+        return True
+    except Exception:
+        logger.exception("Saving PPE result of photo %s failed", file_id)
+        return False
 
-        return {"success": True}
 
-    except Document.DoesNotExist:
-        return {"success": False, "error": "Документ не найден"}
-    except Employee.DoesNotExist:
-        return {"success": False, "error": "Сотрудник не найден"}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+async def set_ppe_result_file_id(
+    file_id: str, model_version: str, threshold: float, result_file_id: str
+):
+    """Запомнить file_id отправленного размеченного фото в записи фотографии"""
+    if not HAS_PPE_RESULT:
+        return
+    try:
+        await _store_ppe_result_file_id(
+            file_id, model_version, threshold, result_file_id
+        )
+    except Exception:
+        logger.exception("Saving sent PPE result of photo %s failed", file_id)
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from bot.misc import PPEConfig
+from ppe.worker import init_worker, ping, process_batch
+
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceExecutor:
+    """
+    Пул процессов для детекции СИЗ
+
+    Держит в каждом процессе заранее загруженный PPEPhotoDetector,
+    чтобы тяжёлый инференс YOLO не блокировал event loop бота.
+    Фотографии, пришедшие в пределах окна ожидания, объединяются
+    в один батч и обрабатываются одним вызовом модели.
+    """
+
+    def __init__(
+        self,
+        model_path=PPEConfig.MODEL_PATH,
+        confidence_threshold=PPEConfig.CONFIDENCE,
+        backend=PPEConfig.BACKEND,
+        imgsz=PPEConfig.IMGSZ,
+        output_max_side=PPEConfig.OUTPUT_MAX_SIDE,
+        output_quality=PPEConfig.OUTPUT_QUALITY,
+        workers=PPEConfig.WORKERS,
+        queue_size=PPEConfig.QUEUE_SIZE,
+        max_batch=PPEConfig.MAX_BATCH,
+        batch_wait=PPEConfig.BATCH_WAIT_MS / 1000,
+    ):
+        self.model_path = model_path
+        self.confidence_threshold = confidence_threshold
+        self.backend = backend
+        self.options = {
+            "imgsz": imgsz,
+            "output_max_side": output_max_side,
+            "output_quality": output_quality,
+        }
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.max_batch = max(1, max_batch)
+        self.batch_wait = batch_wait
+
+        self._pool = None
+        self._slots = None
+        self._pending = []
+        self._flush_handle = None
+
+    def _ensure_started(self):
+        """Ленивый запуск пула при первом обращении"""
+        if self._pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(
+                    self.model_path,
+                    self.confidence_threshold,
+                    self.backend,
+                    self.options,
+                    threads,
+                ),
+            )
+        # Семафор переживает пересоздание пула: его держат ожидающие запросы
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_size)
+
+    def _reset_pool(self, pool):
+        """
+        Сброс сломанного пула (упавший процесс, ошибка загрузки модели)
+
+        Следующий запрос создаст новый пул вместо того, чтобы
+        получать BrokenProcessPool до перезапуска бота.
+        """
+        if pool is None or self._pool is not pool:
+            return
+        logger.error("PPE inference pool is broken, it will be recreated")
+        self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def process_photo(self, image, output_path=None):
+        """
+        Асинхронная обработка фотографии в пуле процессов
+
+        Args:
+            image: Закодированные байты фото (или путь к файлу)
+            output_path (str): Путь для сохранения результата (опционально)
+
+        Returns:
+            tuple: (результат_в_JPEG, детекции, анализ)
+                   или (None, None, None) при ошибке
+        """
+        self._ensure_started()
+
+        # Ограничиваем очередь: при переполнении ждём освобождения места
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending.append((image, output_path, future))
+
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.batch_wait, self._flush)
+
+            return await future
+
+    async def process_photos(self, images):
+        """
+        Обработка всех фотографий документа
+
+        Args:
+            images (list): Закодированные байты фото (или пути к файлам)
+
+        Returns:
+            list: (результат_в_JPEG, детекции, анализ) в порядке входных фото
+        """
+        return await asyncio.gather(*(self.process_photo(image) for image in images))
+
+    def _flush(self):
+        """Отправка накопленных фотографий в пул одним батчем"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        while self._pending:
+            batch = self._pending[: self.max_batch]
+            self._pending = self._pending[self.max_batch :]
+
+            self._ensure_started()
+            pool = self._pool
+            loop = asyncio.get_running_loop()
+            try:
+                pool_future = loop.run_in_executor(
+                    pool,
+                    process_batch,
+                    [image for image, _, _ in batch],
+                    [output_path for _, output_path, _ in batch],
+                )
+            except Exception as e:
+                # Пул сломан (BrokenProcessPool) - батч уже снят с очереди,
+                # поэтому ошибку нужно отдать каждому ожидающему
+                if isinstance(e, BrokenProcessPool):
+                    self._reset_pool(pool)
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            pool_future.add_done_callback(
+                lambda done, batch=batch, pool=pool: self._resolve(batch, done, pool)
+            )
+
+    def _resolve(self, batch, done, pool=None):
+        """Раздача результатов батча ожидающим запросам"""
+        cancelled = done.cancelled()
+        error = None if cancelled else done.exception()
+        if isinstance(error, BrokenProcessPool):
+            self._reset_pool(pool)
+        for i, (_, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            if cancelled:
+                future.cancel()
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
+
+    async def warm_up(self, processes=PPEConfig.WARM_UP):
+        """
+        Запуск процессов пула с загрузкой и прогревом модели
+
+        Вызывается в фоне при старте бота, чтобы первый настоящий
+        анализ не ждал загрузки весов. Пул запускает процессы по мере
+        надобности, поэтому остальные процессы загрузят модель при
+        первой нагрузке.
+
+        Args:
+            processes (int): Сколько процессов запустить (не больше workers)
+
+        Returns:
+            float: Время прогрева в секундах
+        """
+        processes = min(processes, self.workers)
+        if processes <= 0:
+            return None
+
+        self._ensure_started()
+        pool = self._pool
+        started = time.perf_counter()
+
+        loop = asyncio.get_running_loop()
+        try:
+            pids = await asyncio.gather(
+                *(loop.run_in_executor(pool, ping) for _ in range(processes))
+            )
+        except Exception as e:
+            logger.error("PPE warm-up failed: %s", e)
+            if isinstance(e, BrokenProcessPool):
+                self._reset_pool(pool)
+            return None
+
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "PPE inference pool warmed up in %.2fs (%d processes)",
+            elapsed,
+            len(set(pids)),
+        )
+        return elapsed
+
+    def shutdown(self):
+        """Остановка пула процессов"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+            self._slots = None
+
+
+inference_executor = InferenceExecutor()
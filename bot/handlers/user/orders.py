@@ -1,6 +1,8 @@
 # bot/handlers/orders.py
 
-import os
+import asyncio
+import uuid
+from io import BytesIO
 
 from aiogram import F, Router
 from aiogram.types import CallbackQuery, Message
@@ -9,7 +11,11 @@ from aiogram.types import InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InputMediaPhoto
-from .object_detection import PPEPhotoDetector
+from .inference import inference_executor
+from .ppe_cache import ppe_cache
+from .ppe_precompute import precompute_on_upload
+from .ppe_results import load_results, remember_sent, store_result
+from .upload_queue import upload_queue
 from aiogram.types import BufferedInputFile
 
 from bot.database.methods.get import (
@@ -20,16 +26,14 @@ from bot.database.methods.get import (
 )
 from bot.database.methods.update import update_work_status
 
-from bot.database.methods.create import save_document_photo
+from bot.database.methods.create import register_document_photos
 
 from bot.keyboards import get_inline_keyboard
+from bot.misc import SessionConfig, UploadConfig
 
 router = Router()
 
 
-detector = PPEPhotoDetector(model_path="yolo11n.pt", confidence_threshold=0.4)
-
-
 # Состояния для FSM
 class WorkOrderStates(StatesGroup):
     waiting_start_photos = State()
@@ -243,6 +247,36 @@ async def show_order_detail(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
+def _upload_session(data: dict) -> tuple:
+    """Ключ сессии загрузки фото в очереди upload_queue"""
+    return (
+        data.get("document_number"),
+        data.get("photo_type"),
+        data.get("upload_session"),
+    )
+
+
+async def _begin_photo_upload(state: FSMContext, document_number, photo_type):
+    """
+    Начать новую сессию загрузки фото
+
+    Прежняя сессия (например, другого типа фото) закрывается, счётчики
+    обнуляются: её неудачи не попадут в новую сессию.
+    """
+    data = await state.get_data()
+    if data.get("upload_session"):
+        upload_queue.close(_upload_session(data))
+
+    await state.update_data(
+        document_number=document_number,
+        photo_type=photo_type,
+        upload_session=uuid.uuid4().hex,
+        first_photo=True,
+        photos_count=0,
+        failed_count=0,
+    )
+
+
 # Обработчик старта работ
 @router.callback_query(F.data.startswith("start_work:"))
 async def start_work_handler(callback: CallbackQuery, state: FSMContext):
@@ -250,10 +284,7 @@ async def start_work_handler(callback: CallbackQuery, state: FSMContext):
     document_number = callback.data.split(":", 1)[1]
 
     await state.set_state(WorkOrderStates.waiting_start_photos)
-    await state.update_data(
-        document_number=document_number,
-        photo_type="start",
-    )
+    await _begin_photo_upload(state, document_number, "start")
 
     await callback.message.edit_text(
         "📸 Пожалуйста, отправьте фотографии для подтверждения начала работ.",
@@ -272,10 +303,7 @@ async def complete_work_handler(callback: CallbackQuery, state: FSMContext):
     document_number = callback.data.split(":", 1)[1]
 
     await state.set_state(WorkOrderStates.waiting_completion_photos)
-    await state.update_data(
-        document_number=document_number,
-        photo_type="completion",
-    )
+    await _begin_photo_upload(state, document_number, "completion")
 
     await callback.message.edit_text(
         "📸 Пожалуйста, отправьте фотографии для подтверждения завершения работ.",
@@ -289,13 +317,37 @@ async def complete_work_handler(callback: CallbackQuery, state: FSMContext):
 
 @router.message(F.photo, WorkOrderStates.waiting_start_photos)
 @router.message(F.photo, WorkOrderStates.waiting_completion_photos)
-async def handle_work_photos(message: Message, state: FSMContext):
-    """Обработчик получения фотографий для работ"""
+async def handle_work_photos(
+    message: Message, state: FSMContext, album: list | None = None
+):
+    """
+    Обработчик получения фотографий для работ
+
+    Альбом приходит целиком (MediaGroupMiddleware): одно чтение и
+    обновление состояния, одна запись в базу и один ответ.
+    """
+    # Без MediaGroupMiddleware (например, в тестах) - одно фото
+    album = album or [message]
+
     data = await state.get_data()
     document_number = data.get("document_number")
     photo_type = data.get("photo_type")
     first_photo = data.get("first_photo", True)
     photos_count = data.get("photos_count", 0)
+    session = _upload_session(data)
+
+    # Фото, чья фоновая загрузка не удалась, удалены - они не занимают
+    # место в лимите, и пользователь может отправить их заново
+    failed = upload_queue.take_failed(session)
+    if failed:
+        photos_count -= failed
+        await state.update_data(
+            photos_count=photos_count,
+            failed_count=data.get("failed_count", 0) + failed,
+        )
+        await message.answer(
+            f"⚠️ Не удалось сохранить {failed} фото. Отправьте их ещё раз."
+        )
 
     # Ограничение на количество фото
     MAX_PHOTOS = 10
@@ -303,36 +355,63 @@ async def handle_work_photos(message: Message, state: FSMContext):
         await message.answer(f"❌ Превышен лимит фотографий ({MAX_PHOTOS})")
         return
 
-    # Получаем лучшее качество фото
-    best_photo = message.photo[-1]
+    # Лучшее качество каждого фото альбома в пределах лимита
+    best_photos = [item.photo[-1] for item in album if item.photo]
+    skipped = max(0, len(best_photos) - (MAX_PHOTOS - photos_count))
+    best_photos = best_photos[: MAX_PHOTOS - photos_count]
 
-    # Сохраняем фото
-    result = await save_document_photo(
-        message.bot,
-        best_photo.file_id,
+    # Регистрируем фото сразу, а файлы скачиваются в фоне
+    result = await register_document_photos(
+        [(photo.file_id, photo.file_unique_id) for photo in best_photos],
         document_number,
         photo_type,
         message.from_user.id,
     )
 
-    if result["success"]:
-        photos_count += 1
-        await state.update_data(first_photo=False, photos_count=photos_count)
-
-        if first_photo:
-            await message.answer(
-                f"📸 Фото получено ({photos_count}/{MAX_PHOTOS}). "
-                "Когда прикрепите все фотографии, нажмите кнопку ниже.",
-                reply_markup=get_inline_keyboard(
-                    ("✅ Завершить загрузку", "finish_photo_upload"),
-                    ("❌ Отмена", "cancel_photo_upload"),
-                    sizes=(1, 1),
-                ),
-            )
-        else:
-            await message.answer(f"📸 Фото получено ({photos_count}/{MAX_PHOTOS}).")
-    else:
+    if not result["success"]:
         await message.answer(f"❌ Ошибка сохранения фотографии: {result['error']}")
+        return
+
+    unique_ids = {photo.file_id: photo.file_unique_id for photo in best_photos}
+    for registered in result["photos"]:
+        file_id = registered["photo"].file_id
+        await upload_queue.submit(
+            message.bot,
+            session,
+            registered["photo"],
+            registered["filename"],
+            registered["storage_path"],
+            # Анализ СИЗ заранее, пока руководитель не открыл согласование,
+            # по тому же скачанному файлу
+            on_stored=precompute_on_upload(message.bot, file_id, unique_ids[file_id]),
+        )
+
+    if not result["photos"]:
+        await message.answer(
+            "❌ Ошибка сохранения фотографии: Фотография уже была загружена"
+        )
+        return
+
+    photos_count += len(result["photos"])
+    await state.update_data(first_photo=False, photos_count=photos_count)
+
+    text = f"📸 Фото получено ({photos_count}/{MAX_PHOTOS})."
+    if result["duplicates"]:
+        text += f" Повторных фото пропущено: {result['duplicates']}."
+    if skipped:
+        text += f" Сверх лимита не сохранено: {skipped}."
+
+    if first_photo:
+        await message.answer(
+            f"{text} Когда прикрепите все фотографии, нажмите кнопку ниже.",
+            reply_markup=get_inline_keyboard(
+                ("✅ Завершить загрузку", "finish_photo_upload"),
+                ("❌ Отмена", "cancel_photo_upload"),
+                sizes=(1, 1),
+            ),
+        )
+    else:
+        await message.answer(text)
 
 
 @router.callback_query(F.data == "finish_photo_upload")
@@ -342,6 +421,23 @@ async def finish_photo_upload(callback: CallbackQuery, state: FSMContext):
     photos_count = data.get("photos_count", 0)
     document_number = data.get("document_number")
     photo_type = data.get("photo_type")
+    session = _upload_session(data)
+
+    # Ждём только фоновые загрузки этой сессии, но не дольше
+    # UPLOAD_WAIT_TIMEOUT: очередь чата занята, а callback устаревает
+    try:
+        failed = await asyncio.wait_for(
+            upload_queue.wait_session(session), UploadConfig.WAIT_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        await callback.answer(
+            "⏳ Фотографии ещё загружаются. Нажмите кнопку ещё раз через минуту.",
+            show_alert=True,
+        )
+        return
+    # Неудачи, учтённые при приёме следующих альбомов, уже вычтены
+    photos_count -= failed
+    failed_count = data.get("failed_count", 0) + failed
 
     if photo_type == "start":
         await update_work_status(
@@ -360,6 +456,9 @@ async def finish_photo_upload(callback: CallbackQuery, state: FSMContext):
             f"📸 Сохранено {photos_count} фото"
         )
 
+    if failed_count:
+        text += f"\n⚠️ Не удалось сохранить {failed_count} фото"
+
     await callback.message.edit_text(
         text,
         reply_markup=get_inline_keyboard(
@@ -368,6 +467,7 @@ async def finish_photo_upload(callback: CallbackQuery, state: FSMContext):
         ),
     )
 
+    upload_queue.close(session)
     await state.clear()
     await callback.answer()
 
@@ -387,6 +487,7 @@ async def back_to_order_handler(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "cancel_photo_upload")
 async def cancel_photo_upload_handler(callback: CallbackQuery, state: FSMContext):
     """Обработчик отмены загрузки фотографий"""
+    upload_queue.close(_upload_session(await state.get_data()))
     await callback.message.edit_text("❌ Загрузка фотографий отменена.")
     await state.clear()
     await callback.answer("Загрузка отменена")
@@ -482,6 +583,124 @@ async def handle_approve_completion(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
+async def _analyze_photos(callback: CallbackQuery, photos: list):
+    """
+    Анализ СИЗ на фотографиях документа
+
+    Детекция выполняется в пуле процессов, поэтому event loop
+    продолжает обрабатывать апдейты других пользователей. Все фото
+    документа отправляются в пул вместе и попадают в один батч.
+    Фото скачиваются и обрабатываются в памяти, без временных файлов.
+    Уже проанализированные фото (в том числе в фоне при загрузке)
+    читаются из локального кэша или записей фото без обращения к
+    Telegram: getFile и скачивание нужны только для остальных фото.
+
+    Returns:
+        tuple: (вердикты, медиагруппа с результатами,
+                (file_id, file_unique_id) исходных фото для каждого
+                элемента медиагруппы)
+    """
+
+    async def fetch(idx, photo):
+        try:
+            file_info = await callback.bot.get_file(photo["file_id"])
+            if not photo.get("file_unique_id"):
+                # Без file_unique_id в записи фото могло быть
+                # проанализировано под другим file_id
+                cached = await ppe_cache.get(file_info.file_unique_id)
+                if cached:
+                    return file_info.file_unique_id, cached, None
+
+            buffer = await callback.bot.download_file(
+                file_info.file_path,
+                destination=BytesIO(),
+                timeout=SessionConfig.DOWNLOAD_TIMEOUT,
+            )
+            return file_info.file_unique_id, None, buffer.getvalue()
+        except Exception as e:
+            print(f"Ошибка при обработке фото {idx}: {e}")
+            return None, None, None
+
+    verdicts = ["Ошибка обработки"] * len(photos)
+    media_group = []
+    cache_keys = []
+
+    try:
+        # --- Готовые результаты (анализ при загрузке)
+        stored = await load_results(photos)
+        fetched = [None] * len(photos)
+        results = {}
+        for idx, photo in enumerate(photos):
+            if photo["file_id"] in stored:
+                result = stored[photo["file_id"]]
+                file_unique_id = result["file_unique_id"] or photo.get("file_unique_id")
+                fetched[idx] = (file_unique_id, result, None)
+                results[idx] = result
+
+        # --- Загрузка файлов (или результатов из кэша) для остальных
+        missing = [idx for idx in range(len(photos)) if fetched[idx] is None]
+        for idx, item in zip(
+            missing,
+            await asyncio.gather(*(fetch(idx, photos[idx]) for idx in missing)),
+        ):
+            fetched[idx] = item
+            if item[1]:
+                results[idx] = item[1]
+
+        # --- Детекция только для фото без готового результата
+        ready = [idx for idx, (_, _, content) in enumerate(fetched) if content]
+        processed = await inference_executor.process_photos(
+            [fetched[idx][2] for idx in ready]
+        )
+
+        for idx, (result_jpeg, detections, analysis) in zip(ready, processed):
+            if result_jpeg is None:
+                print(f"Ошибка при обработке фото {idx}")
+                continue
+
+            await store_result(
+                photos[idx]["file_id"],
+                fetched[idx][0],
+                detections,
+                analysis,
+                result_jpeg,
+            )
+            results[idx] = {
+                "analysis": analysis,
+                "image": result_jpeg,
+                "result_file_id": None,
+            }
+
+        for idx in sorted(results):
+            result = results[idx]
+            verdict = result["analysis"]["safety_status"]
+
+            # Добавим как отдельное фото с подписью
+            media = result["result_file_id"] or BufferedInputFile(
+                result["image"], filename=f"result_{idx}.jpg"
+            )
+            media_group.append(
+                InputMediaPhoto(
+                    media=media, caption=f"📊 Результат анализа {idx+1}\n{verdict}"
+                )
+            )
+            cache_keys.append((photos[idx]["file_id"], fetched[idx][0]))
+
+            verdicts[idx] = verdict
+
+    except Exception as e:
+        print(f"Ошибка при анализе фотографий: {e}")
+
+    return verdicts, media_group, cache_keys
+
+
+async def _remember_sent_results(messages: list, cache_keys: list):
+    """Сохраняем file_id отправленных результатов, чтобы не загружать их повторно"""
+    for message, (file_id, file_unique_id) in zip(messages, cache_keys):
+        if message.photo:
+            await remember_sent(file_id, file_unique_id, message.photo[-1].file_id)
+
+
 @router.callback_query(F.data.startswith("analyze_ppe_start:"))
 async def analyze_ppe_start(callback: CallbackQuery, state: FSMContext):
     document_number = callback.data.split(":", 1)[1]
@@ -503,55 +722,12 @@ async def analyze_ppe_start(callback: CallbackQuery, state: FSMContext):
         "🔄 Анализ СИЗ в процессе...\nПожалуйста, подождите."
     )
 
-    verdicts = []
-    media_group = []
-
-    for idx, photo in enumerate(photos):
-        try:
-            # --- Загрузка файла
-            # Скачиваем файл из Telegram на диск
-            file_info = await callback.bot.get_file(photo["file_id"])
-
-            # Используем file_id вместо несуществующего 'id'
-            local_path = f"temp_photo_{idx}_{photo['file_id'][-10:]}.jpg"
-            result_path = f"result_{idx}_{photo['file_id'][-10:]}.jpg"
-
-            await callback.bot.download_file(file_info.file_path, local_path)
-
-            # --- Детекция
-            result_img, detections, analysis = detector.process_photo(
-                local_path, output_path=result_path
-            )
-            verdict = analysis["safety_status"]
-
-            # Добавим как отдельное фото с подписью
-            with open(result_path, "rb") as f:
-                buf = BufferedInputFile(f.read(), filename=f"result_{idx}.jpg")
-                media_group.append(
-                    InputMediaPhoto(
-                        media=buf, caption=f"📊 Результат анализа {idx+1}\n{verdict}"
-                    )
-                )
-
-            verdicts.append(verdict)
-
-        except Exception as e:
-            print(f"Ошибка при обработке фото {idx}: {e}")
-            verdicts.append("Ошибка обработки")
-
-        finally:
-            # --- Очистка временных файлов
-            try:
-                if os.path.exists(local_path):
-                    os.remove(local_path)
-                if os.path.exists(result_path):
-                    os.remove(result_path)
-            except Exception as e:
-                print(f"Ошибка при удалении файлов: {e}")
+    verdicts, media_group, cache_keys = await _analyze_photos(callback, photos)
 
     # Отправляем результат только если есть обработанные фото
     if media_group:
-        await callback.message.answer_media_group(media_group)
+        messages = await callback.message.answer_media_group(media_group)
+        await _remember_sent_results(messages, cache_keys)
 
         # Формируем общий вердикт
         safe_count = sum(
@@ -616,54 +792,12 @@ async def analyze_ppe_completion(callback: CallbackQuery, state: FSMContext):
         "🔄 Анализ СИЗ в процессе...\nПожалуйста, подождите."
     )
 
-    verdicts = []
-    media_group = []
-
-    for idx, photo in enumerate(photos):
-        try:
-            # --- Загрузка файла
-            file_info = await callback.bot.get_file(photo["file_id"])
-
-            # Используем индекс и часть file_id для уникальности
-            local_path = f"temp_photo_{idx}_{photo['file_id'][-10:]}.jpg"
-            result_path = f"result_{idx}_{photo['file_id'][-10:]}.jpg"
-
-            await callback.bot.download_file(file_info.file_path, local_path)
-
-            # --- Детекция
-            result_img, detections, analysis = detector.process_photo(
-                local_path, output_path=result_path
-            )
-            verdict = analysis["safety_status"]
-
-            # Добавим как отдельное фото с подписью
-            with open(result_path, "rb") as f:
-                buf = BufferedInputFile(f.read(), filename=f"result_{idx}.jpg")
-                media_group.append(
-                    InputMediaPhoto(
-                        media=buf, caption=f"📊 Результат анализа {idx+1}\n{verdict}"
-                    )
-                )
-
-            verdicts.append(verdict)
-
-        except Exception as e:
-            print(f"Ошибка при обработке фото {idx}: {e}")
-            verdicts.append("Ошибка обработки")
-
-        finally:
-            # --- Очистка временных файлов
-            try:
-                if os.path.exists(local_path):
-                    os.remove(local_path)
-                if os.path.exists(result_path):
-                    os.remove(result_path)
-            except Exception as e:
-                print(f"Ошибка при удалении файлов: {e}")
+    verdicts, media_group, cache_keys = await _analyze_photos(callback, photos)
 
     # Отправляем результат только если есть обработанные фото
     if media_group:
-        await callback.message.answer_media_group(media_group)
+        messages = await callback.message.answer_media_group(media_group)
+        await _remember_sent_results(messages, cache_keys)
 
         # Формируем общий вердикт
         safe_count = sum(
@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import time
+
+from bot.misc import PPEConfig
+from bot.misc.sqlite import SQLiteDatabase
+
+from ppe.object_detection import get_backend_model_path
+
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    """Сериализация детекций и скаляров NumPy в JSON"""
+    if hasattr(value, "to_list"):
+        return value.to_list()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def to_json(value):
+    """Детекции или анализ в виде простых списков и словарей для JSON"""
+    return json.loads(json.dumps(value, ensure_ascii=False, default=_json_default))
+
+
+def get_model_version(model_path):
+    """
+    Версия модели для ключа кэша
+
+    Меняется при замене файла весов, поэтому результаты старой
+    модели не выдаются после её обновления.
+    """
+    name = os.path.basename(model_path.rstrip("/\\"))
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return name
+    return f"{name}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+class PPEResultCache:
+    """
+    Персистентный кэш результатов анализа СИЗ
+
+    Ключ - file_unique_id фотографии в Telegram, версия модели и порог
+    уверенности; дополнительно запись находится по file_id, под которым
+    фото сохранено в документе. Хранит детекции, анализ и размеченное
+    изображение (или file_id уже отправленного результата). Старые записи
+    вытесняются по LRU при превышении лимитов по количеству и размеру.
+
+    Это локальный слой процесса перед результатами в записях фото
+    (см. ppe_results), которые видят все реплики.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS ppe_results (
+            file_unique_id TEXT NOT NULL,
+            file_id TEXT,
+            model_version TEXT NOT NULL,
+            threshold REAL NOT NULL,
+            detections TEXT NOT NULL,
+            analysis TEXT NOT NULL,
+            image BLOB,
+            result_file_id TEXT,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (file_unique_id, model_version, threshold)
+        );
+        CREATE INDEX IF NOT EXISTS ppe_results_last_access
+            ON ppe_results (last_access);
+        CREATE INDEX IF NOT EXISTS ppe_results_file_id ON ppe_results (file_id);
+    """
+
+    def __init__(
+        self,
+        path=PPEConfig.CACHE_PATH,
+        model_version=None,
+        threshold=PPEConfig.CONFIDENCE,
+        max_entries=PPEConfig.CACHE_MAX_ENTRIES,
+        max_bytes=PPEConfig.CACHE_MAX_MB * 1024 * 1024,
+    ):
+        self.path = path
+        # Результат зависит и от предобработки, поэтому её параметры входят в версию
+        self.model_version = model_version or (
+            get_model_version(
+                get_backend_model_path(PPEConfig.MODEL_PATH, PPEConfig.BACKEND)
+            )
+            + f":{PPEConfig.IMGSZ}:{PPEConfig.OUTPUT_MAX_SIDE}:{PPEConfig.OUTPUT_QUALITY}"
+        )
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._db = SQLiteDatabase(path, self.SCHEMA)
+
+    @staticmethod
+    def _entry(row):
+        _, file_unique_id, detections, analysis, image, result_file_id = row[:6]
+        return {
+            "file_unique_id": file_unique_id,
+            "detections": json.loads(detections),
+            "analysis": json.loads(analysis),
+            "image": image,
+            "result_file_id": result_file_id,
+        }
+
+    def _touch(self, connection, rowids):
+        connection.executemany(
+            "UPDATE ppe_results SET last_access = ? WHERE rowid = ?",
+            [(time.time(), rowid) for rowid in rowids],
+        )
+        connection.commit()
+
+    def _get(self, connection, column, value):
+        row = connection.execute(
+            "SELECT rowid, file_unique_id, detections, analysis, image, "
+            "result_file_id "
+            f"FROM ppe_results WHERE {column} = ? "
+            "AND model_version = ? AND threshold = ?",
+            (value, self.model_version, self.threshold),
+        ).fetchone()
+        if row is None:
+            return None
+
+        self._touch(connection, [row[0]])
+        return self._entry(row)
+
+    def _get_many(self, connection, photos):
+        file_ids = [photo["file_id"] for photo in photos]
+        unique_ids = [
+            photo["file_unique_id"] for photo in photos if photo.get("file_unique_id")
+        ]
+        rows = connection.execute(
+            "SELECT rowid, file_unique_id, detections, analysis, image, "
+            "result_file_id, file_id FROM ppe_results "
+            f"WHERE (file_id IN ({', '.join('?' * len(file_ids))}) "
+            f"OR file_unique_id IN ({', '.join('?' * len(unique_ids))})) "
+            "AND model_version = ? AND threshold = ?",
+            (*file_ids, *unique_ids, self.model_version, self.threshold),
+        ).fetchall()
+        if not rows:
+            return {}
+
+        self._touch(connection, [row[0] for row in rows])
+        by_file_id = {row[6]: row for row in rows}
+        by_unique_id = {row[1]: row for row in rows}
+        results = {}
+        for photo in photos:
+            row = by_file_id.get(photo["file_id"]) or by_unique_id.get(
+                photo.get("file_unique_id")
+            )
+            if row is not None:
+                results[photo["file_id"]] = self._entry(row)
+        return results
+
+    def _put(self, connection, file_unique_id, detections, analysis, image, file_id):
+        detections = json.dumps(detections, ensure_ascii=False, default=_json_default)
+        analysis = json.dumps(analysis, ensure_ascii=False, default=_json_default)
+        size = len(detections) + len(analysis) + len(image or b"")
+
+        connection.execute(
+            "INSERT OR REPLACE INTO ppe_results "
+            "(file_unique_id, file_id, model_version, threshold, detections, "
+            "analysis, image, result_file_id, size, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?, ?)",
+            (
+                file_unique_id,
+                file_id,
+                self.model_version,
+                self.threshold,
+                detections,
+                analysis,
+                image,
+                size,
+                time.time(),
+            ),
+        )
+        self._evict(connection)
+        connection.commit()
+
+    def _set_result_file_id(self, connection, file_unique_id, result_file_id):
+        # Изображение уже лежит на серверах Telegram - байты больше не нужны
+        connection.execute(
+            "UPDATE ppe_results SET result_file_id = ?, image = NULL, "
+            "size = length(detections) + length(analysis) "
+            "WHERE file_unique_id = ? AND model_version = ? AND threshold = ?",
+            (result_file_id, file_unique_id, self.model_version, self.threshold),
+        )
+        connection.commit()
+
+    def _evict(self, connection):
+        """Вытеснение давно не использованных записей сверх лимитов"""
+        count, total = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ppe_results"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        rows = connection.execute(
+            "SELECT rowid, size FROM ppe_results ORDER BY last_access"
+        ).fetchall()
+        stale = []
+        for rowid, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            stale.append((rowid,))
+            count -= 1
+            total -= size
+        connection.executemany("DELETE FROM ppe_results WHERE rowid = ?", stale)
+
+    async def get(self, file_unique_id):
+        """
+        Получить сохранённый результат анализа
+
+        Returns:
+            dict: file_unique_id, detections, analysis, image, result_file_id
+                  или None
+        """
+        try:
+            return await self._db.run(self._get, "file_unique_id", file_unique_id)
+        except Exception as e:
+            logger.warning("PPE cache read failed: %s", e)
+            return None
+
+    async def get_many(self, photos):
+        """
+        Результаты анализа для нескольких фото одним запросом
+
+        Args:
+            photos (list): Словари с file_id и (если известен) file_unique_id
+
+        Returns:
+            dict: file_id -> результат (как у get) для найденных фото
+        """
+        if not photos:
+            return {}
+        try:
+            return await self._db.run(self._get_many, photos)
+        except Exception as e:
+            logger.warning("PPE cache read failed: %s", e)
+            return {}
+
+    async def put(self, file_unique_id, detections, analysis, image, file_id=None):
+        """Сохранить результат анализа"""
+        try:
+            await self._db.run(
+                self._put, file_unique_id, detections, analysis, image, file_id
+            )
+        except Exception as e:
+            logger.warning("PPE cache write failed: %s", e)
+
+    async def set_result_file_id(self, file_unique_id, result_file_id):
+        """Запомнить file_id отправленного размеченного изображения"""
+        try:
+            await self._db.run(
+                self._set_result_file_id, file_unique_id, result_file_id
+            )
+        except Exception as e:
+            logger.warning("PPE cache write failed: %s", e)
+
+
+ppe_cache = PPEResultCache()
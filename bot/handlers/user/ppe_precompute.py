@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from io import BytesIO
+
+from aiogram import Bot
+
+from bot.misc import PPEConfig, SessionConfig
+
+from .inference import inference_executor
+from .ppe_results import load_results, store_result
+
+
+logger = logging.getLogger(__name__)
+
+# Ссылки на запущенные задачи, чтобы их не собрал сборщик мусора;
+# их число ограничено PPEConfig.PRECOMPUTE_QUEUE
+_background_tasks = set()
+
+
+async def precompute_analysis(bot: Bot, file_id: str, file_unique_id: str, source=None):
+    """
+    Анализ СИЗ для только что загруженной фотографии
+
+    Результат сохраняется в записи фото (и в локальном кэше), поэтому
+    при согласовании анализ на любой реплике читается без обращения
+    к модели.
+
+    Args:
+        source: Уже скачанное фото (байты или путь к файлу); без него
+                фото скачивается из Telegram
+    """
+    try:
+        photo = {"file_id": file_id, "file_unique_id": file_unique_id}
+        if await load_results([photo]):
+            return
+
+        if source is None:
+            buffer = await bot.download(
+                file_id, destination=BytesIO(), timeout=SessionConfig.DOWNLOAD_TIMEOUT
+            )
+            source = buffer.getvalue()
+        result_jpeg, detections, analysis = await inference_executor.process_photo(
+            source
+        )
+        if result_jpeg is None:
+            logger.error("Background PPE analysis of photo %s failed", file_id)
+            return
+
+        await store_result(file_id, file_unique_id, detections, analysis, result_jpeg)
+    except Exception as e:
+        logger.error("Background PPE analysis of photo %s failed: %s", file_id, e)
+
+
+def schedule_precompute(bot: Bot, file_id: str, file_unique_id: str, source=None):
+    """
+    Поставить фоновый анализ фотографии в очередь (если включён)
+
+    Каждая задача держит фото в памяти, поэтому при заполненной очереди
+    анализ отбрасывается: он всё равно выполнится при согласовании.
+    """
+    if not PPEConfig.PRECOMPUTE:
+        return
+    if len(_background_tasks) >= PPEConfig.PRECOMPUTE_QUEUE:
+        logger.warning("Background PPE queue is full, photo %s skipped", file_id)
+        return
+
+    task = asyncio.create_task(
+        precompute_analysis(bot, file_id, file_unique_id, source)
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def precompute_on_upload(bot: Bot, file_id: str, file_unique_id: str):
+    """
+    Колбэк для очереди загрузки: анализ по уже скачанному файлу
+
+    Returns:
+        callable: on_stored для upload_queue.submit или None, если
+                  фоновый анализ выключен
+    """
+    if not PPEConfig.PRECOMPUTE:
+        return None
+    return lambda source: schedule_precompute(bot, file_id, file_unique_id, source)
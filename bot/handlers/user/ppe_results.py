@@ -0,0 +1,63 @@
+from bot.database.methods.get import get_ppe_results
+from bot.database.methods.update import save_ppe_result, set_ppe_result_file_id
+
+from .ppe_cache import ppe_cache, to_json
+
+
+async def load_results(photos: list) -> dict:
+    """
+    Готовые результаты анализа СИЗ для фотографий
+
+    Один запрос к локальному кэшу процесса, затем для остальных фото
+    один запрос к записям фото в базе (их видят все реплики); найденное
+    в базе копируется в кэш.
+
+    Args:
+        photos (list): Словари с file_id и (если известен) file_unique_id
+
+    Returns:
+        dict: file_id -> file_unique_id, detections, analysis, image,
+              result_file_id
+    """
+    results = await ppe_cache.get_many(photos)
+
+    missing = [photo["file_id"] for photo in photos if photo["file_id"] not in results]
+    stored = await get_ppe_results(missing, ppe_cache.model_version, ppe_cache.threshold)
+    for file_id, result in stored.items():
+        results[file_id] = result
+        if result["file_unique_id"]:
+            await ppe_cache.put(
+                result["file_unique_id"],
+                result["detections"],
+                result["analysis"],
+                result["image"],
+                file_id=file_id,
+            )
+            if result["result_file_id"]:
+                await ppe_cache.set_result_file_id(
+                    result["file_unique_id"], result["result_file_id"]
+                )
+    return results
+
+
+async def store_result(file_id, file_unique_id, detections, analysis, image):
+    """Сохранить результат анализа в записи фото и в локальном кэше"""
+    detections, analysis = to_json(detections), to_json(analysis)
+    await save_ppe_result(
+        file_id,
+        file_unique_id,
+        ppe_cache.model_version,
+        ppe_cache.threshold,
+        detections,
+        analysis,
+        image,
+    )
+    await ppe_cache.put(file_unique_id, detections, analysis, image, file_id=file_id)
+
+
+async def remember_sent(file_id, file_unique_id, result_file_id):
+    """Запомнить file_id отправленного размеченного фото"""
+    await set_ppe_result_file_id(
+        file_id, ppe_cache.model_version, ppe_cache.threshold, result_file_id
+    )
+    await ppe_cache.set_result_file_id(file_unique_id, result_file_id)
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+from collections import Counter, defaultdict
+
+from aiogram import Bot
+
+from bot.misc import UploadConfig
+from bot.database.methods.create import (
+    discard_document_photo,
+    store_document_photo_file,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class PhotoUploadQueue:
+    """
+    Фоновое сохранение файлов фотографий работ
+
+    Запись фото создаётся сразу при получении, а скачивание из Telegram
+    и запись в хранилище выполняет ограниченный пул воркеров с повторами.
+    Задания группируются по сессии загрузки (документ, тип фото и метка
+    сессии из состояния FSM): завершение загрузки ждёт только свои задания.
+    """
+
+    # Сколько сессий помнят число неудачных загрузок до wait_session
+    FAILED_LIMIT = 1000
+
+    def __init__(
+        self,
+        workers=UploadConfig.WORKERS,
+        queue_size=UploadConfig.QUEUE_SIZE,
+        retries=UploadConfig.RETRIES,
+        retry_delay=UploadConfig.RETRY_DELAY,
+    ):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.retries = max(1, retries)
+        self.retry_delay = retry_delay
+
+        self._queue = None
+        self._tasks = []
+        self._pending = defaultdict(set)
+        self._failed = Counter()
+
+    def _ensure_started(self):
+        """Ленивый запуск воркеров при первом обращении"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+            self._tasks = [
+                asyncio.create_task(self._worker()) for _ in range(self.workers)
+            ]
+
+    async def submit(
+        self,
+        bot: Bot,
+        session: tuple,
+        photo,
+        filename,
+        storage_path,
+        on_stored=None,
+    ):
+        """
+        Поставить сохранение файла зарегистрированной фотографии в очередь
+
+        Args:
+            session (tuple): Сессия загрузки (для wait_session и take_failed)
+            photo: DocumentPhoto из register_document_photos
+            filename (str): Имя файла
+            storage_path (str): Путь в локальном хранилище или None
+            on_stored (callable): Вызывается после сохранения со скачанным
+                                  фото (путь или байты), чтобы не скачивать
+                                  его повторно
+        """
+        self._ensure_started()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[session].add(future)
+        future.add_done_callback(lambda done: self._forget(session, done))
+
+        job = (bot, session, photo, filename, storage_path, future, on_stored)
+        # Очередь ограничена: при переполнении ждём освобождения места
+        try:
+            await self._queue.put(job)
+        except BaseException:
+            # Задание не попало в очередь - wait_session не должен его ждать
+            future.cancel()
+            raise
+
+    def _forget(self, session, future):
+        futures = self._pending.get(session)
+        if futures is None:
+            return
+        futures.discard(future)
+        if not futures:
+            del self._pending[session]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._upload(*job)
+            except Exception as e:
+                logger.error("Photo upload worker error: %s", e)
+            finally:
+                self._queue.task_done()
+
+    async def _upload(
+        self, bot, session, photo, filename, storage_path, future, on_stored
+    ):
+        for attempt in range(1, self.retries + 1):
+            try:
+                source = await store_document_photo_file(
+                    bot,
+                    photo,
+                    filename,
+                    storage_path,
+                    keep_content=on_stored is not None,
+                )
+            except Exception as e:
+                logger.warning(
+                    "Photo %s upload attempt %d/%d failed: %s",
+                    photo.file_id,
+                    attempt,
+                    self.retries,
+                    e,
+                )
+                if attempt < self.retries:
+                    await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+                continue
+
+            # Результат ставится вне try: ошибка здесь не должна
+            # привести к повторному скачиванию уже сохранённого файла
+            if not future.done():
+                future.set_result(True)
+            if on_stored is not None:
+                try:
+                    on_stored(source)
+                except Exception as e:
+                    logger.error("Photo %s on_stored error: %s", photo.file_id, e)
+            return
+
+        try:
+            # Файл получить не удалось - запись без файла не оставляем
+            await discard_document_photo(photo)
+        finally:
+            # Закрытая сессия (отмена, завершение) неудачи уже не ждёт
+            if session in self._pending:
+                self._failed[session] += 1
+                # Сессии, которые никто не дождался, не копятся бесконечно
+                while len(self._failed) > self.FAILED_LIMIT:
+                    del self._failed[next(iter(self._failed))]
+            if not future.done():
+                future.set_result(False)
+
+    def take_failed(self, session: tuple) -> int:
+        """
+        Сколько фотографий сессии не удалось сохранить с прошлого вызова
+
+        Не ждёт незавершённые загрузки. Отданные здесь неудачи не
+        попадут в результат wait_session.
+        """
+        return self._failed.pop(session, 0)
+
+    async def wait_session(self, session: tuple) -> int:
+        """
+        Дождаться сохранения всех фотографий сессии загрузки
+
+        Returns:
+            int: Сколько фотографий сохранить не удалось (не считая
+                 уже отданных take_failed)
+        """
+        futures = list(self._pending.get(session, ()))
+        if futures:
+            # asyncio.wait, в отличие от gather, не отменяет задания
+            # очереди, если отменили сам ожидающий обработчик
+            await asyncio.wait(futures)
+        return self.take_failed(session)
+
+    def close(self, session: tuple):
+        """
+        Закрыть сессию загрузки (отмена, завершение, смена типа фото)
+
+        Незавершённые задания дорабатывают, но их неудачи больше не
+        учитываются и не попадут в следующую сессию.
+        """
+        self._pending.pop(session, None)
+        self._failed.pop(session, None)
+
+    async def shutdown(self, timeout: float = 30):
+        """Дожидается очереди (не дольше timeout) и останавливает воркеры"""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Photo upload queue stopped with %d jobs left", self._queue.qsize()
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._queue = None
+        self._tasks = []
+
+
+upload_queue = PhotoUploadQueue()
@@ -1,32 +1,121 @@
+import asyncio
 import logging
+import time
+
+# Отметка начала импорта - точка отсчёта бюджета холодного старта
+_import_started = time.perf_counter()
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.bot import DefaultBotProperties
 
 from bot.filters import register_all_filters
-from bot.misc import TgKeys
+from bot.misc import TgKeys, BotConfig, PPEConfig
+from bot.misc.storage import create_storage
+from bot.misc.rate_limit import RateLimitMiddleware
+from bot.misc.session import TunedAiohttpSession
 from bot.handlers import register_all_handlers
 from bot.database.models import register_models
-from .middleware import AuthMiddleware
+from bot.database.executor import db_executor
+from bot.handlers.user.inference import inference_executor
+from bot.handlers.user.upload_queue import upload_queue
+from .webhook import run_webhook
+from .middleware import (
+    EmployeeMemoMiddleware,
+    MediaGroupMiddleware,
+    SchedulerMiddleware,
+)
+
+
+# Ссылка на фоновый прогрев, чтобы задачу не собрал сборщик мусора
+_warm_up_task = None
+
+
+async def __on_start_up(dp: Dispatcher, events_isolation=None) -> None:
+    global _warm_up_task
 
+    dp.update.outer_middleware(EmployeeMemoMiddleware())
+    dp.message.outer_middleware(MediaGroupMiddleware())
+
+    # Общий планировщик: очередь чата, общий лимит и полоса тяжёлых апдейтов
+    scheduler = SchedulerMiddleware(events_isolation=events_isolation)
+    dp.message.outer_middleware(scheduler)
+    dp.callback_query.outer_middleware(scheduler)
 
-async def __on_start_up(dp: Dispatcher) -> None:
     register_all_filters(dp)
     register_all_handlers(dp)
     register_models()
 
+    # Модель грузится и прогревается в фоне, не задерживая начало polling;
+    # при PPE_WARM_UP=0 пул запустится при первом анализе
+    if PPEConfig.WARM_UP > 0:
+        _warm_up_task = asyncio.create_task(inference_executor.warm_up())
 
-async def start_bot():
+
+def __check_startup_budget() -> None:
+    elapsed = time.perf_counter() - _import_started
+    if elapsed > BotConfig.STARTUP_BUDGET:
+        logging.warning(
+            "Cold start took %.2fs, over the %.2fs budget",
+            elapsed,
+            BotConfig.STARTUP_BUDGET,
+        )
+    else:
+        logging.info("Cold start took %.2fs", elapsed)
+
+
+async def __prepare() -> tuple[Bot, Dispatcher]:
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
     )
 
-    bot = Bot(token=TgKeys.TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-    dp = Dispatcher(storage=MemoryStorage())
+    bot = Bot(
+        token=TgKeys.TOKEN,
+        session=TunedAiohttpSession(),
+        default=DefaultBotProperties(parse_mode="HTML"),
+    )
+    bot.session.middleware(RateLimitMiddleware())
+    storage, events_isolation = create_storage()
+    # Изоляцию берёт SchedulerMiddleware после сборки альбома
+    dp = Dispatcher(storage=storage)
+
+    await __on_start_up(dp, events_isolation)
+    return bot, dp
+
 
-    await __on_start_up(dp)
+async def __shutdown(bot: Bot) -> None:
+    # Фото, принятые до остановки, дописываются в хранилище
+    await upload_queue.shutdown()
+    inference_executor.shutdown()
+    db_executor.shutdown()
+    # Дозагрузка фото могла заново открыть соединения
+    await bot.session.close()
+
+
+async def start_bot():
+    bot, dp = await __prepare()
 
     await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot, skip_updates=True)
+    __check_startup_budget()
+    try:
+        # Лимит задач polling - только защита памяти: он намного больше
+        # лимитов SchedulerMiddleware, чтобы ждущие в очередях планировщика
+        # апдейты не останавливали чтение новых
+        await dp.start_polling(
+            bot,
+            skip_updates=True,
+            tasks_concurrency_limit=BotConfig.MAX_PENDING_UPDATES,
+        )
+    finally:
+        await __shutdown(bot)
+
+
+async def start_webhook():
+    """Приём апдейтов через webhook вместо long polling"""
+    bot, dp = await __prepare()
+
+    __check_startup_budget()
+    try:
+        await run_webhook(bot, dp)
+    finally:
+        await __shutdown(bot)
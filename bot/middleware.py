@@ -1,8 +1,18 @@
+import asyncio
+import logging
 from aiogram import BaseMiddleware
-from aiogram.types import TelegramObject
-from typing import Callable, Awaitable, Dict
+from aiogram.fsm.storage.base import BaseEventIsolation
+from aiogram.fsm.storage.memory import DisabledEventIsolation
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from typing import Callable, Awaitable, Dict, Optional
+
+from bot.misc import BotConfig
 
 from bot.database.methods.get import get_employee_by_telegram_id
+from bot.database.methods.cache import start_update_memo, reset_update_memo
+
+
+logger = logging.getLogger(__name__)
 
 
 class AuthMiddleware(BaseMiddleware):
@@ -22,3 +32,162 @@ class AuthMiddleware(BaseMiddleware):
 
         data["employee"] = employee  # передаём в хендлер
         return await handler(event, data)
+
+
+class EmployeeMemoMiddleware(BaseMiddleware):
+    """Мемо сотрудников на время одного апдейта: один сотрудник - один запрос"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict], Awaitable],
+        event: TelegramObject,
+        data: Dict,
+    ) -> Awaitable:
+        token = start_update_memo()
+        try:
+            return await handler(event, data)
+        finally:
+            reset_update_memo(token)
+
+
+class MediaGroupMiddleware(BaseMiddleware):
+    """
+    Сборка альбома (media_group_id) в один вызов обработчика
+
+    Telegram присылает каждое фото альбома отдельным сообщением.
+    Первое сообщение ждёт, пока новые части альбома перестанут
+    приходить в течение окна ожидания, и передаёт обработчику весь
+    альбом в data["album"]; остальные сообщения дальше не проходят.
+    Сообщения вне альбома получают album из одного сообщения.
+    """
+
+    def __init__(self, wait: float = BotConfig.MEDIA_GROUP_WAIT_MS / 1000):
+        self.wait = wait
+        self._albums: Dict[tuple, list] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict], Awaitable],
+        event: Message,
+        data: Dict,
+    ) -> Awaitable:
+        if not event.media_group_id:
+            data["album"] = [event]
+            return await handler(event, data)
+
+        key = (event.chat.id, event.media_group_id)
+        album = self._albums.get(key)
+        if album is not None:
+            album.append(event)
+            return  # Обработается вместе с первым сообщением альбома
+
+        self._albums[key] = album = [event]
+        try:
+            received = 0
+            while received != len(album):
+                received = len(album)
+                await asyncio.sleep(self.wait)
+        finally:
+            del self._albums[key]
+
+        data["album"] = sorted(album, key=lambda message: message.message_id)
+        return await handler(event, data)
+
+
+# Префиксы callback-данных тяжёлых операций (анализ СИЗ)
+HEAVY_CALLBACK_PREFIXES = ("analyze_ppe_",)
+
+
+def is_heavy_update(event: TelegramObject) -> bool:
+    """Анализ СИЗ и загрузка фото - тяжёлая полоса, остальное - лёгкая"""
+    if isinstance(event, CallbackQuery):
+        return (event.data or "").startswith(HEAVY_CALLBACK_PREFIXES)
+    if isinstance(event, Message):
+        return bool(event.photo)
+    return False
+
+
+class SchedulerMiddleware(BaseMiddleware):
+    """
+    Ограничение одновременной обработки апдейтов
+
+    - апдейты одного пользователя в одном чате выполняются строго по
+      очереди, поэтому обновления FSM (photos_count) не гоняются;
+    - всего одновременно обрабатывается не больше max_concurrent апдейтов;
+    - тяжёлые апдейты (is_heavy_update) занимают не больше max_heavy
+      из них, так что лёгкие callback-и не ждут за анализом СИЗ;
+    - в очереди одного чата ждёт не больше max_chat_queue апдейтов,
+      лишние отбрасываются: чат, засыпающий бота запросами, не занимает
+      общий лимит принятых апдейтов (MAX_PENDING_UPDATES).
+
+    Один экземпляр регистрируется на message и callback_query после
+    MediaGroupMiddleware, чтобы альбом собирался до очереди чата.
+    Изоляция событий FSM между репликами (events_isolation) берётся
+    здесь же, а не в Dispatcher: иначе части альбома ждали бы друг
+    друга на замке хранилища и не собирались бы в один вызов.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = BotConfig.MAX_CONCURRENT_UPDATES,
+        max_heavy: int = BotConfig.MAX_HEAVY_UPDATES,
+        max_chat_queue: int = BotConfig.MAX_CHAT_QUEUE,
+        is_heavy: Callable[[TelegramObject], bool] = is_heavy_update,
+        events_isolation: Optional[BaseEventIsolation] = None,
+    ):
+        self.is_heavy = is_heavy
+        self.max_chat_queue = max(1, max_chat_queue)
+        self.events_isolation = events_isolation or DisabledEventIsolation()
+        self._slots = asyncio.Semaphore(max(1, max_concurrent))
+        self._heavy_slots = asyncio.Semaphore(max(1, min(max_heavy, max_concurrent)))
+        # Очереди чатов: ключ -> (замок, число ожидающих)
+        self._chat_locks: Dict[tuple, list] = {}
+
+    def _chat_key(self, event: TelegramObject, data: Dict):
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        if chat is None and user is None:
+            return None
+        return (chat.id if chat else None, user.id if user else None)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict], Awaitable],
+        event: TelegramObject,
+        data: Dict,
+    ) -> Awaitable:
+        key = self._chat_key(event, data)
+        if key is None:
+            return await self._run(handler, event, data)
+
+        entry = self._chat_locks.setdefault(key, [asyncio.Lock(), 0])
+        if entry[1] >= self.max_chat_queue:
+            logger.warning("Chat %s queue is full, update dropped", key)
+            if isinstance(event, CallbackQuery):
+                await event.answer("⏳ Предыдущий запрос ещё выполняется")
+            return
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await self._run_isolated(handler, event, data)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[key]
+
+    async def _run_isolated(self, handler, event, data):
+        state = data.get("state")
+        if state is None:
+            return await self._run(handler, event, data)
+        async with self.events_isolation.lock(key=state.key):
+            # Состояние прочитано до очереди чата - перечитываем под замком,
+            # чтобы фильтры видели результат предыдущего апдейта
+            data["raw_state"] = await state.get_state()
+            return await self._run(handler, event, data)
+
+    async def _run(self, handler, event, data):
+        if self.is_heavy(event):
+            async with self._heavy_slots, self._slots:
+                return await handler(event, data)
+        async with self._slots:
+            return await handler(event, data)
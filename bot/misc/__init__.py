@@ -1 +1,9 @@
-from bot.misc.env import TgKeys
\ No newline at end of file
+from bot.misc.env import (
+    TgKeys,
+    BotConfig,
+    SessionConfig,
+    WebhookConfig,
+    DBConfig,
+    UploadConfig,
+    PPEConfig,
+)
\ No newline at end of file
@@ -1,3 +1,4 @@
+import os
 from os import getenv
 from dotenv import load_dotenv
 from typing import Final
@@ -8,3 +9,136 @@ load_dotenv()
 
 class TgKeys:
     TOKEN: Final = getenv("TOKEN", "define me!")
+
+
+class BotConfig:
+    """Общие настройки запуска бота"""
+
+    # Бюджет холодного старта (от импорта до начала приёма апдейтов), секунды
+    STARTUP_BUDGET: Final = float(getenv("STARTUP_BUDGET", "3.0"))
+    # Пауза без новых фото, после которой альбом считается полученным
+    MEDIA_GROUP_WAIT_MS: Final = int(getenv("MEDIA_GROUP_WAIT_MS", "300"))
+    # Апдейтов в обработке одновременно, из них тяжёлых (анализ СИЗ, фото)
+    MAX_CONCURRENT_UPDATES: Final = int(getenv("MAX_CONCURRENT_UPDATES", "64"))
+    MAX_HEAVY_UPDATES: Final = int(getenv("MAX_HEAVY_UPDATES", "8"))
+    # Апдейтов одного чата в очереди; сверх этого апдейты чата отбрасываются
+    MAX_CHAT_QUEUE: Final = int(getenv("MAX_CHAT_QUEUE", "16"))
+    # Принятых апдейтов всего, включая ждущих в очередях планировщика.
+    # Должно быть заметно больше MAX_CONCURRENT_UPDATES: иначе ждущие
+    # тяжёлые апдейты и очередь одного чата перестают пускать лёгкие
+    MAX_PENDING_UPDATES: Final = int(getenv("MAX_PENDING_UPDATES", "1024"))
+
+    # Исходящие сообщения в секунду: всего, в личный чат (с запасом), в группу
+    SEND_RATE_GLOBAL: Final = float(getenv("SEND_RATE_GLOBAL", "30"))
+    SEND_RATE_CHAT: Final = float(getenv("SEND_RATE_CHAT", "1"))
+    SEND_BURST_CHAT: Final = float(getenv("SEND_BURST_CHAT", "3"))
+    SEND_RATE_GROUP: Final = float(getenv("SEND_RATE_GROUP", "0.33"))
+    # Повторы запроса после flood control (TelegramRetryAfter)
+    RETRY_AFTER_ATTEMPTS: Final = int(getenv("RETRY_AFTER_ATTEMPTS", "3"))
+
+    # FSM-хранилище: memory, sqlite или redis
+    FSM_STORAGE: Final = getenv("FSM_STORAGE", "memory")
+    FSM_REDIS_URL: Final = getenv("FSM_REDIS_URL", "redis://localhost:6379/0")
+    FSM_SQLITE_PATH: Final = getenv("FSM_SQLITE_PATH", "fsm_states.sqlite3")
+    # Время жизни неактивного состояния, секунды (0 - бессрочно)
+    FSM_STATE_TTL: Final = int(getenv("FSM_STATE_TTL", "86400"))
+
+
+class SessionConfig:
+    """Настройки HTTP-соединений с Bot API"""
+
+    # Пул запросов к API: соединений, keep-alive и кэш DNS (секунды)
+    API_LIMIT: Final = int(getenv("SESSION_API_LIMIT", "100"))
+    KEEPALIVE: Final = float(getenv("SESSION_KEEPALIVE", "30"))
+    DNS_TTL: Final = int(getenv("SESSION_DNS_TTL", "300"))
+    API_TIMEOUT: Final = float(getenv("SESSION_API_TIMEOUT", "60"))
+    # Скачивание файлов: соединений отдельного пула и таймауты (секунды)
+    DOWNLOAD_LIMIT: Final = int(getenv("SESSION_DOWNLOAD_LIMIT", "8"))
+    DOWNLOAD_TIMEOUT: Final = float(getenv("SESSION_DOWNLOAD_TIMEOUT", "120"))
+    CONNECT_TIMEOUT: Final = float(getenv("SESSION_CONNECT_TIMEOUT", "10"))
+
+
+class WebhookConfig:
+    """Настройки приёма апдейтов через webhook (python run.py --mode webhook)"""
+
+    # Публичный адрес, на который Telegram присылает апдейты (без пути)
+    URL: Final = getenv("WEBHOOK_URL", "")
+    PATH: Final = getenv("WEBHOOK_PATH", "/webhook")
+    # Обязателен: Telegram присылает его в X-Telegram-Bot-Api-Secret-Token
+    SECRET: Final = getenv("WEBHOOK_SECRET", "")
+    # Адрес, на котором слушает aiohttp-сервер
+    HOST: Final = getenv("WEBHOOK_HOST", "0.0.0.0")
+    PORT: Final = int(getenv("WEBHOOK_PORT", "8080"))
+    # Соединений от Telegram одновременно (1-100)
+    MAX_CONNECTIONS: Final = int(getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+    # Принятых апдейтов одновременно; сверх лимита запрос ждёт
+    CONCURRENCY: Final = int(
+        getenv("WEBHOOK_CONCURRENCY", str(BotConfig.MAX_PENDING_UPDATES))
+    )
+    # Сколько ждать обработки принятых апдейтов при остановке, секунды
+    SHUTDOWN_TIMEOUT: Final = float(getenv("WEBHOOK_SHUTDOWN_TIMEOUT", "30"))
+
+
+class DBConfig:
+    """Настройки доступа к базе данных"""
+
+    # Кэш сотрудников по telegram_id
+    EMPLOYEE_CACHE_TTL: Final = float(getenv("EMPLOYEE_CACHE_TTL", "60"))
+    EMPLOYEE_CACHE_SIZE: Final = int(getenv("EMPLOYEE_CACHE_SIZE", "1024"))
+    # Чтение через нативный async ORM Django (aget, async for) вместо пула db_executor
+    ASYNC_ORM: Final = getenv("DB_ASYNC_ORM", "0") == "1"
+    # Потоки для ORM; 0 - по размеру пула соединений Django (или 8)
+    EXECUTOR_WORKERS: Final = int(getenv("DB_EXECUTOR_WORKERS", "0"))
+    # Держать соединение каждого потока пула открытым между операциями.
+    # Выключено - соблюдается CONN_MAX_AGE Django (при 0 соединение
+    # закрывается после операции); включено - база должна выдержать
+    # EXECUTOR_WORKERS соединений на каждую реплику
+    PERSISTENT_CONNECTIONS: Final = getenv("DB_PERSISTENT_CONNECTIONS", "0") == "1"
+    # Ожидание в очереди пула, после которого пишется предупреждение
+    SLOW_WAIT_MS: Final = int(getenv("DB_SLOW_WAIT_MS", "100"))
+
+
+class UploadConfig:
+    """Настройки фоновой загрузки фотографий работ"""
+
+    # Одновременные скачивания из Telegram
+    WORKERS: Final = int(getenv("UPLOAD_WORKERS", "4"))
+    # Максимум фото в очереди; при заполнении приём ждёт освобождения места
+    QUEUE_SIZE: Final = int(getenv("UPLOAD_QUEUE_SIZE", "100"))
+    # Попытки скачивания и пауза перед первым повтором (далее удваивается)
+    RETRIES: Final = int(getenv("UPLOAD_RETRIES", "3"))
+    RETRY_DELAY: Final = float(getenv("UPLOAD_RETRY_DELAY", "1.0"))
+    # Сколько «Завершить загрузку» ждёт фоновые загрузки, секунды
+    WAIT_TIMEOUT: Final = float(getenv("UPLOAD_WAIT_TIMEOUT", "10"))
+
+
+class PPEConfig:
+    """Настройки детектора СИЗ и пула инференса"""
+
+    MODEL_PATH: Final = getenv("PPE_MODEL_PATH", "yolo11n.pt")
+    # Бэкенд инференса: pytorch, onnx или openvino
+    BACKEND: Final = getenv("PPE_BACKEND", "pytorch")
+    CONFIDENCE: Final = float(getenv("PPE_CONFIDENCE", "0.4"))
+    # Количество процессов инференса (по умолчанию - все ядра)
+    WORKERS: Final = int(getenv("PPE_WORKERS", str(os.cpu_count() or 1)))
+    # Процессов, загружающих модель при старте бота (по умолчанию - все);
+    # 0 - не прогревать: пул запустится при первом анализе
+    WARM_UP: Final = int(getenv("PPE_WARM_UP", str(WORKERS)))
+    # Максимум фотографий, одновременно ожидающих обработки
+    QUEUE_SIZE: Final = int(getenv("PPE_QUEUE_SIZE", "32"))
+    # Максимальный размер батча и окно ожидания его заполнения
+    MAX_BATCH: Final = int(getenv("PPE_MAX_BATCH", "8"))
+    BATCH_WAIT_MS: Final = int(getenv("PPE_BATCH_WAIT_MS", "20"))
+    # Персистентный кэш результатов анализа
+    CACHE_PATH: Final = getenv("PPE_CACHE_PATH", "ppe_cache.sqlite3")
+    CACHE_MAX_ENTRIES: Final = int(getenv("PPE_CACHE_MAX_ENTRIES", "5000"))
+    CACHE_MAX_MB: Final = int(getenv("PPE_CACHE_MAX_MB", "256"))
+    # Фоновый анализ фотографий сразу после загрузки
+    PRECOMPUTE: Final = getenv("PPE_PRECOMPUTE", "0") == "1"
+    # Максимум фоновых анализов сразу; сверх него фото не анализируются
+    # заранее (анализ выполнится при согласовании)
+    PRECOMPUTE_QUEUE: Final = int(getenv("PPE_PRECOMPUTE_QUEUE", "16"))
+    # Предобработка: размер входа модели и параметры размеченного JPEG
+    IMGSZ: Final = int(getenv("PPE_IMGSZ", "640"))
+    OUTPUT_MAX_SIDE: Final = int(getenv("PPE_OUTPUT_MAX_SIDE", "1280"))
+    OUTPUT_QUALITY: Final = int(getenv("PPE_OUTPUT_QUALITY", "85"))
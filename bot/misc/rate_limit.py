@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Set
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    EditMessageCaption,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    SendMediaGroup,
+    TelegramMethod,
+)
+
+from bot.misc.env import BotConfig
+
+
+logger = logging.getLogger(__name__)
+
+# Правки одного сообщения, из очереди которых отправляется только последняя
+COALESCED_METHODS = (EditMessageText, EditMessageCaption, EditMessageReplyMarkup)
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate токенов в секунду, запас не больше capacity
+
+    Ожидающие получают токены в порядке очереди.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, cost: float = 1.0):
+        cost = min(cost, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self._tokens < cost:
+                await asyncio.sleep((cost - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= cost
+
+    def pause(self, seconds: float):
+        """Остановить выдачу на seconds (после flood control от Telegram)"""
+        self._refill()
+        self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+    @property
+    def idle(self) -> bool:
+        self._refill()
+        return self._tokens >= self.capacity and not self._lock.locked()
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Ограничение частоты исходящих запросов бота
+
+    - отправки и правки в чат проходят через общее ведро (лимит бота)
+      и ведро чата (личный чат или группа), альбом стоит по числу фото;
+    - при TelegramRetryAfter запрос повторяется после retry_after,
+      а остальные отправки ждут вместе с ним: в этот чат и (через
+      общее ведро) во все остальные;
+    - если правка сообщения ещё ждёт очереди, а пришла новая правка
+      того же сообщения, отправляется только новая, и оба вызова
+      получают её результат.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = BotConfig.SEND_RATE_GLOBAL,
+        chat_rate: float = BotConfig.SEND_RATE_CHAT,
+        chat_burst: float = BotConfig.SEND_BURST_CHAT,
+        group_rate: float = BotConfig.SEND_RATE_GROUP,
+        retry_attempts: int = BotConfig.RETRY_AFTER_ATTEMPTS,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.retry_attempts = max(1, retry_attempts)
+
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._coalesced: Dict[tuple, list] = {}
+        # Задачи отправки правок, чьих вызывающих могли отменить
+        self._sending: Set[asyncio.Task] = set()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Не даём словарю расти: полные и свободные вёдра не нужны
+            if len(self._chats) > 10000:
+                self._chats = {
+                    key: value for key, value in self._chats.items() if not value.idle
+                }
+            # Отрицательный chat_id - группа или канал
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst)
+        return bucket
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ):
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(chat_id, int):
+            # Служебные запросы (get_file и т.п.) и чаты по @username
+            return await self._send(make_request, bot, method, None)
+
+        if isinstance(method, COALESCED_METHODS) and method.message_id:
+            key = (type(method), chat_id, method.message_id)
+            entry = self._coalesced.get(key)
+            if entry is not None:
+                # Более новая правка заменяет ждущую в очереди
+                entry[0] = method
+                return await asyncio.shield(entry[1])
+
+            entry = self._coalesced[key] = [method, None]
+            # Правка отправляется отдельной задачей: если первый вызов
+            # отменят, её всё равно получат остальные ждущие
+            task = entry[1] = asyncio.ensure_future(
+                self._send_coalesced(make_request, bot, key, entry, chat_id)
+            )
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+            return await asyncio.shield(task)
+
+        await self._acquire(chat_id, method)
+        return await self._send(make_request, bot, method, chat_id)
+
+    async def _send_coalesced(self, make_request, bot, key, entry, chat_id):
+        try:
+            await self._acquire(chat_id, entry[0])
+        finally:
+            del self._coalesced[key]
+        return await self._send(make_request, bot, entry[0], chat_id)
+
+    async def _acquire(self, chat_id: int, method: TelegramMethod):
+        cost = len(method.media) if isinstance(method, SendMediaGroup) else 1
+        await self._chat_bucket(chat_id).acquire(cost)
+        await self._global.acquire(cost)
+
+    async def _send(self, make_request, bot, method, chat_id):
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.retry_attempts:
+                    raise
+                logger.warning(
+                    "Flood control on %s, retry in %ss",
+                    type(method).__name__,
+                    e.retry_after,
+                )
+                # Flood control может касаться всего бота, а не одного чата
+                self._global.pause(e.retry_after)
+                if chat_id is not None:
+                    self._chat_bucket(chat_id).pause(e.retry_after)
+                await asyncio.sleep(e.retry_after)
@@ -0,0 +1,102 @@
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from aiohttp import ClientSession, ClientTimeout
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram.__meta__ import __version__
+from aiogram.client.session.aiohttp import AiohttpSession
+
+from bot.misc.env import SessionConfig
+
+
+class TunedAiohttpSession(AiohttpSession):
+    """
+    Сессия Bot API с настраиваемым пулом соединений и отдельным пулом
+    для скачивания файлов
+
+    Запросы к API (answer, edit_text, ...) идут через основной пул,
+    а bot.download / download_file - через свой пул с отдельным
+    лимитом соединений, поэтому тяжёлые скачивания фото не занимают
+    соединения, нужные быстрым ответам. Таймаут скачивания задаёт
+    вызывающий код (SessionConfig.DOWNLOAD_TIMEOUT).
+    """
+
+    def __init__(
+        self,
+        limit: int = SessionConfig.API_LIMIT,
+        keepalive: float = SessionConfig.KEEPALIVE,
+        dns_ttl: int = SessionConfig.DNS_TTL,
+        timeout: float = SessionConfig.API_TIMEOUT,
+        connect_timeout: float = SessionConfig.CONNECT_TIMEOUT,
+        download_limit: int = SessionConfig.DOWNLOAD_LIMIT,
+        **kwargs: Any,
+    ):
+        # Настройки пула, которые должны пережить смену прокси: aiogram
+        # при этом собирает настройки коннектора заново
+        self._tuned_connector_init: Dict[str, Any] = {
+            "limit": limit,
+            "keepalive_timeout": keepalive,
+            "ttl_dns_cache": dns_ttl,
+        }
+        super().__init__(limit=limit, timeout=timeout, **kwargs)
+        self._connector_init.update(self._tuned_connector_init)
+        self.connect_timeout = connect_timeout
+        self.download_limit = download_limit
+
+        self._download_session: Optional[ClientSession] = None
+        # Настройки коннектора, с которыми создан пул скачивания
+        self._download_connector_init: Optional[Dict[str, Any]] = None
+
+    def _setup_proxy_connector(self, proxy: Any) -> None:
+        super()._setup_proxy_connector(proxy)
+        self._connector_init.update(self._tuned_connector_init)
+
+    async def create_session(self) -> ClientSession:
+        # Базовая реализация при сбросе коннектора вызывает close(), который
+        # закрыл бы и пул скачивания; тот пересоздаётся сам при смене настроек
+        if self._should_reset_connector:
+            await super().close()
+            self._should_reset_connector = False
+        return await super().create_session()
+
+    async def create_download_session(self) -> ClientSession:
+        """Ленивое создание сессии для скачивания файлов"""
+        session = self._download_session
+        if session is not None and not session.closed:
+            # Смена прокси заменяет настройки коннектора - пул создаётся заново
+            if self._download_connector_init is self._connector_init:
+                return session
+            await session.close()
+
+        self._download_connector_init = self._connector_init
+        self._download_session = ClientSession(
+            connector=self._connector_type(
+                **{**self._connector_init, "limit": self.download_limit}
+            ),
+            headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}"},
+        )
+        return self._download_session
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: Optional[Dict[str, Any]] = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True,
+    ) -> AsyncGenerator[bytes, None]:
+        session = await self.create_download_session()
+
+        async with session.get(
+            url,
+            timeout=ClientTimeout(total=timeout, sock_connect=self.connect_timeout),
+            headers=headers or {},
+            raise_for_status=raise_for_status,
+        ) as resp:
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                yield chunk
+
+    async def close(self) -> None:
+        if self._download_session is not None and not self._download_session.closed:
+            await self._download_session.close()
+        await super().close()
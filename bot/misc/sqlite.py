@@ -0,0 +1,44 @@
+import asyncio
+import sqlite3
+import threading
+
+
+class SQLiteDatabase:
+    """
+    Локальный файл SQLite для вспомогательных данных бота
+
+    Соединение одно на процесс: открывается при первом обращении
+    (журнал WAL, схема создаётся скриптом schema) и используется из
+    потоков asyncio.to_thread под общей блокировкой.
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def connect(self):
+        """Ленивое открытие базы"""
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.schema)
+            self._connection = connection
+        return self._connection
+
+    def call(self, func, *args, **kwargs):
+        """Выполнить func(connection, ...) под блокировкой в текущем потоке"""
+        with self._lock:
+            return func(self.connect(), *args, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнить func(connection, ...) в отдельном потоке"""
+        return await asyncio.to_thread(self.call, func, *args, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,180 @@
+import json
+import time
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseEventIsolation,
+    BaseStorage,
+    DefaultKeyBuilder,
+    StateType,
+    StorageKey,
+)
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot.misc.env import BotConfig
+from bot.misc.sqlite import SQLiteDatabase
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище в локальной SQLite
+
+    Состояние загрузки фото переживает перезапуск бота. Подходит для
+    нескольких процессов на одной машине; для реплик на разных машинах
+    нужен Redis. Записи, не обновлявшиеся дольше ttl, считаются пустыми
+    и периодически удаляются.
+    """
+
+    # Как часто (в записях) удалять устаревшие состояния
+    PURGE_EVERY = 500
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS fsm_states_updated ON fsm_states (updated);
+    """
+
+    def __init__(self, path=BotConfig.FSM_SQLITE_PATH, ttl=BotConfig.FSM_STATE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+        self._db = SQLiteDatabase(path, self.SCHEMA)
+        self._writes = 0
+
+    def _read(self, connection, key):
+        row = connection.execute(
+            "SELECT state, data, updated FROM fsm_states WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (self.ttl and row[2] < time.time() - self.ttl):
+            return None, {}
+        return row[0], json.loads(row[1])
+
+    def _write(self, connection, key, state, data):
+        if state is None and not data:
+            connection.execute("DELETE FROM fsm_states WHERE key = ?", (key,))
+        else:
+            connection.execute(
+                "INSERT OR REPLACE INTO fsm_states (key, state, data, updated) "
+                "VALUES (?, ?, ?, ?)",
+                (key, state, json.dumps(data, ensure_ascii=False), time.time()),
+            )
+
+        self._writes += 1
+        if self.ttl and self._writes % self.PURGE_EVERY == 0:
+            connection.execute(
+                "DELETE FROM fsm_states WHERE updated < ?", (time.time() - self.ttl,)
+            )
+        connection.commit()
+
+    def _modify(self, connection, key, state=None, data=None, merge=False):
+        """Чтение и запись записи за один переход в поток"""
+        current_state, current_data = self._read(connection, key)
+        if state is not None:
+            current_state = state or None
+        if data is not None:
+            current_data = {**current_data, **data} if merge else dict(data)
+        self._write(connection, key, current_state, current_data)
+        return current_data
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        # Пустая строка - сброс состояния (None означает "не менять")
+        await self._db.run(self._modify, self.key_builder.build(key), state=state or "")
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._db.run(self._read, self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._db.run(self._modify, self.key_builder.build(key), data=data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._db.run(self._read, self.key_builder.build(key))
+        return data
+
+    async def update_data(
+        self, key: StorageKey, data: Mapping[str, Any]
+    ) -> Dict[str, Any]:
+        current = await self._db.run(
+            self._modify, self.key_builder.build(key), data=data, merge=True
+        )
+        return current.copy()
+
+    async def close(self) -> None:
+        self._db.close()
+
+
+def _create_redis_storage(url, ttl):
+    """
+    Redis-хранилище с атомарным update_data
+
+    Стандартный RedisStorage делает update_data двумя командами (GET и
+    SET), и две реплики могут потерять обновления друг друга. Здесь
+    чтение и запись идут одной транзакцией WATCH/MULTI/EXEC в пайплайне.
+    """
+    try:
+        from aiogram.fsm.storage.redis import RedisStorage
+        from redis.exceptions import WatchError
+    except ImportError as e:
+        raise RuntimeError(
+            "FSM_STORAGE=redis требует пакет redis (pip install redis)"
+        ) from e
+
+    class PipelinedRedisStorage(RedisStorage):
+        async def update_data(
+            self, key: StorageKey, data: Mapping[str, Any]
+        ) -> Dict[str, Any]:
+            redis_key = self.key_builder.build(key, "data")
+            async with self.redis.pipeline(transaction=True) as pipe:
+                while True:
+                    try:
+                        await pipe.watch(redis_key)
+                        value = await pipe.get(redis_key)
+                        current = self.json_loads(value) if value else {}
+                        current.update(data)
+
+                        pipe.multi()
+                        pipe.set(redis_key, self.json_dumps(current), ex=self.data_ttl)
+                        await pipe.execute()
+                        return current.copy()
+                    except WatchError:
+                        # Запись изменила другая реплика - повторяем
+                        continue
+
+    ttl = ttl or None
+    return PipelinedRedisStorage.from_url(
+        url,
+        key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+        state_ttl=ttl,
+        data_ttl=ttl,
+    )
+
+
+def create_storage(
+    backend: str = BotConfig.FSM_STORAGE,
+) -> tuple[BaseStorage, Optional[BaseEventIsolation]]:
+    """
+    FSM-хранилище по настройке FSM_STORAGE
+
+    memory - в памяти процесса (состояния теряются при перезапуске);
+    sqlite - локальный файл FSM_SQLITE_PATH;
+    redis - сервер (или совместимый) FSM_REDIS_URL, для нескольких реплик.
+
+    Returns:
+        tuple: (хранилище, изоляция событий для SchedulerMiddleware или None)
+    """
+    if backend == "memory":
+        return MemoryStorage(), None
+    if backend == "sqlite":
+        return SQLiteStorage(), None
+    if backend == "redis":
+        storage = _create_redis_storage(BotConfig.FSM_REDIS_URL, BotConfig.FSM_STATE_TTL)
+        # Апдейты одного чата не обрабатываются разными репликами одновременно
+        return storage, storage.create_isolation()
+    raise ValueError(f"Неизвестное FSM-хранилище: {backend}")
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from bot.misc import WebhookConfig
+
+
+logger = logging.getLogger(__name__)
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """
+    Приём апдейтов webhook с ограничением одновременной обработки
+
+    Telegram получает ответ сразу, а апдейт обрабатывается в фоне.
+    Когда заняты все слоты, новый запрос не принимается до освобождения
+    места - Telegram подождёт и не будет засыпать процесс апдейтами.
+    При остановке принятые апдейты дорабатываются не дольше shutdown_timeout.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        concurrency: int = WebhookConfig.CONCURRENCY,
+        shutdown_timeout: float = WebhookConfig.SHUTDOWN_TIMEOUT,
+        **kwargs,
+    ):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self.shutdown_timeout = shutdown_timeout
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request):
+        await self._slots.acquire()
+        try:
+            return await super()._handle_request_background(bot, request)
+        except BaseException:
+            # Задача обработки не создана - слот освобождаем здесь
+            self._slots.release()
+            raise
+
+    async def _background_feed_update(self, bot: Bot, update: dict):
+        try:
+            await super()._background_feed_update(bot, update)
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        """Дождаться обработки принятых апдейтов и закрыть сессию бота"""
+        pending = set(self._background_feed_update_tasks)
+        if pending:
+            logger.info("Waiting for %d updates before shutdown", len(pending))
+            _, unfinished = await asyncio.wait(pending, timeout=self.shutdown_timeout)
+            for task in unfinished:
+                task.cancel()
+        await super().close()
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher) -> None:
+    """
+    Запуск aiohttp-сервера webhook до сигнала остановки
+
+    Несколько экземпляров за балансировщиком могут обслуживать один
+    WEBHOOK_URL: каждый регистрирует один и тот же адрес, а накопленные
+    апдейты при перезапуске не сбрасываются.
+    """
+    if not WebhookConfig.URL:
+        raise RuntimeError("Для режима webhook нужен WEBHOOK_URL")
+    # Пользователи авторизуются по from_user.id, поэтому без секрета
+    # любой, кто видит адрес, мог бы прислать апдейт от чужого имени
+    if not WebhookConfig.SECRET:
+        raise RuntimeError("Для режима webhook нужен WEBHOOK_SECRET")
+
+    app = web.Application()
+    LimitedRequestHandler(dp, bot, secret_token=WebhookConfig.SECRET).register(
+        app, path=WebhookConfig.PATH
+    )
+    setup_application(app, dp, bot=bot)
+
+    await bot.set_webhook(
+        url=WebhookConfig.URL.rstrip("/") + WebhookConfig.PATH,
+        secret_token=WebhookConfig.SECRET,
+        max_connections=WebhookConfig.MAX_CONNECTIONS,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+
+    runner = web.AppRunner(app, shutdown_timeout=WebhookConfig.SHUTDOWN_TIMEOUT)
+    await runner.setup()
+    await web.TCPSite(runner, WebhookConfig.HOST, WebhookConfig.PORT).start()
+    logger.info(
+        "Webhook server listening on %s:%d", WebhookConfig.HOST, WebhookConfig.PORT
+    )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: остановка по Ctrl+C через отмену задачи
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        # Сначала перестаём принимать запросы, затем дорабатываем принятые
+        await runner.cleanup()
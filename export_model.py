@@ -0,0 +1,43 @@
+import argparse
+from os import getenv
+
+from dotenv import load_dotenv
+
+from ppe.object_detection import check_parity, export_model
+
+
+# Настройки читаются напрямую: импорт bot.misc загрузил бы бота и Django
+load_dotenv()
+MODEL_PATH = getenv("PPE_MODEL_PATH", "yolo11n.pt")
+CONFIDENCE = float(getenv("PPE_CONFIDENCE", "0.4"))
+IMGSZ = int(getenv("PPE_IMGSZ", "640"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Экспорт модели СИЗ в ONNX/OpenVINO и проверка совпадения детекций"
+    )
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--backend", choices=("onnx", "openvino"), default="onnx")
+    parser.add_argument("--imgsz", type=int, default=IMGSZ)
+    parser.add_argument(
+        "--check", nargs="*", default=[], help="изображения для проверки паритета"
+    )
+    args = parser.parse_args()
+
+    path = export_model(args.model, args.backend, args.imgsz)
+    print(f"Модель экспортирована: {path}")
+
+    if args.check:
+        report = check_parity(
+            args.check, args.model, args.backend, CONFIDENCE
+        )
+        print(
+            f"Совпало рамок: {report['matched']}, "
+            f"расхождений: {report['unmatched']}, "
+            f"макс. разница уверенности: {report['max_confidence_delta']:.4f}"
+        )
+        print(
+            f"Время: pytorch {report['reference_time']:.2f}с, "
+            f"{args.backend} {report['candidate_time']:.2f}с"
+        )
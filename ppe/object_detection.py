@@ -0,0 +1,819 @@
+import cv2
+import numpy as np
+import os
+import threading
+import time
+from collections.abc import Sequence
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFont
+
+
+# Бэкенды инференса: формат экспорта ultralytics (None - исходная модель PyTorch)
+BACKENDS = {
+    'pytorch': None,
+    'onnx': 'onnx',
+    'openvino': 'openvino',
+}
+
+
+def get_backend_model_path(model_path, backend='pytorch'):
+    """
+    Путь к артефакту модели для выбранного бэкенда
+    
+    Args:
+        model_path (str): Путь к исходной модели (.pt)
+        backend (str): pytorch, onnx или openvino
+        
+    Returns:
+        str: Путь к файлу/каталогу модели
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд инференса: {backend}")
+    
+    stem = os.path.splitext(model_path)[0]
+    if backend == 'onnx':
+        return f"{stem}.onnx"
+    if backend == 'openvino':
+        return f"{stem}_openvino_model"
+    return model_path
+
+
+# Компактная запись одной детекции
+DETECTION_DTYPE = np.dtype([
+    ('class_id', np.int32),
+    ('confidence', np.float32),
+    ('bbox', np.int32, (4,)),
+    ('area', np.int64),
+])
+
+
+class Detections(Sequence):
+    """
+    Детекции одного изображения в структурированном массиве NumPy
+    
+    Для совместимости ведёт себя как список словарей
+    {'class', 'class_ru', 'confidence', 'bbox', 'area'}: словарь
+    собирается только при обращении к конкретному элементу.
+    """
+    
+    def __init__(self, records, names, translations):
+        """
+        Args:
+            records (np.ndarray): Массив с dtype DETECTION_DTYPE
+            names (dict): Названия классов модели по class_id
+            translations (dict): Перевод названий классов
+        """
+        self.records = records
+        self.names = names
+        self.translations = translations
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Detections(self.records[index], self.names, self.translations)
+        
+        record = self.records[index]
+        class_name = self.names[int(record['class_id'])]
+        return {
+            'class': class_name,
+            'class_ru': self.translations.get(class_name, class_name),
+            'confidence': float(record['confidence']),
+            'bbox': record['bbox'].tolist(),
+            'area': int(record['area']),
+        }
+    
+    def where(self, mask):
+        """Детекции, отобранные булевой маской"""
+        return Detections(self.records[mask], self.names, self.translations)
+    
+    def of_classes(self, predicate):
+        """Детекции классов, название которых удовлетворяет условию"""
+        class_ids = [
+            class_id for class_id, name in self.names.items() if predicate(name)
+        ]
+        return self.where(np.isin(self.records['class_id'], class_ids))
+    
+    def to_list(self):
+        """Список словарей (для сериализации)"""
+        return list(self)
+
+
+@lru_cache(maxsize=None)
+def _find_cyrillic_font():
+    """Поиск шрифта, поддерживающего кириллицу (один раз на процесс)"""
+    font_paths = [
+        # Windows
+        "C:/Windows/Fonts/arial.ttf",
+        "C:/Windows/Fonts/calibri.ttf",
+        "C:/Windows/Fonts/tahoma.ttf",
+        # Linux
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+        # macOS
+        "/System/Library/Fonts/Arial.ttf",
+        "/System/Library/Fonts/Helvetica.ttc",
+    ]
+    
+    for font_path in font_paths:
+        if os.path.exists(font_path):
+            return font_path
+    
+    # Если системный шрифт не найден, используем шрифт по умолчанию PIL
+    return None
+
+
+class PPEPhotoDetector:
+    # Максимум закэшированных плашек подписей
+    LABEL_CACHE_SIZE = 1024
+    
+    def __init__(self, model_path='yolo11n.pt', confidence_threshold=0.5, backend='pytorch',
+                 imgsz=640, output_max_side=1280, output_quality=85):
+        """
+        Детектор СИЗ для фотографий
+        
+        Args:
+            model_path (str): Путь к модели YOLO (по умолчанию best.pt)
+            confidence_threshold (float): Порог уверенности для детекции
+            backend (str): Бэкенд инференса - pytorch, onnx или openvino.
+                           Для onnx/openvino используется артефакт,
+                           полученный через export_model()
+            imgsz (int): Размер входа модели
+            output_max_side (int): Максимальная сторона размеченного
+                                   изображения (0 - без уменьшения)
+            output_quality (int): Качество JPEG размеченного изображения
+        """
+        self.imgsz = imgsz
+        self.output_max_side = output_max_side
+        self.output_quality = output_quality
+        
+        # ultralytics и torch импортируем только при реальном создании детектора
+        from ultralytics import YOLO
+
+        # Загружаем модель YOLO
+        self.backend = backend
+        self.model_path = get_backend_model_path(model_path, backend)
+        if not os.path.exists(self.model_path) and backend != 'pytorch':
+            raise FileNotFoundError(
+                f"Модель для бэкенда {backend} не найдена: {self.model_path}. "
+                f"Выполните экспорт: python export_model.py --backend {backend}"
+            )
+        self.model = YOLO(self.model_path, task='detect')
+        self.confidence_threshold = confidence_threshold
+        
+        # Классы СИЗ с переводом
+        self.ppe_classes = {
+            'person': 'Человек',
+            'car': 'Автомобиль',
+            'truck': 'Грузовик',
+            'bus': 'Автобус',
+            'motorcycle': 'Мотоцикл',
+            'bicycle': 'Велосипед',
+            'backpack': 'Рюкзак',
+            'umbrella': 'Зонт',
+            'suitcase': 'Чемодан',
+            'helmet': 'Каска',  # если есть в кастомных классах
+            'sports ball': 'Каска',
+        }
+
+        
+        # Цвета для разных объектов (RGB для PIL)
+        self.colors = {
+            'person': (0, 102, 255),        # белый        # синий
+            'truck': (255, 51, 0),            # красный
+            'bus': (255, 165, 0),             # оранжевый
+            'motorcycle': (204, 0, 204),      # фиолетовый
+            'bicycle': (0, 255, 0),           # зелёный
+            'backpack': (255, 255, 0),        # жёлтый
+            'umbrella': (102, 0, 204),        # тёмно-фиолетовый
+            'suitcase': (0, 153, 153),        # бирюзовый
+            'helmet': (0, 255, 255),          # голубой (если появится)
+            'sports ball': (0, 255, 255),          # голубой (если появится)
+            'unknown': (128, 128, 128)        # серый (по умолчанию)
+        }
+
+        
+        # Пытаемся загрузить шрифт для кириллицы
+        self.font_path = self._find_cyrillic_font()
+        self._fonts = {}
+        self._label_patches = {}
+        
+        print(f"Модель загружена: {self.model_path} (бэкенд: {backend})")
+        print(f"Шрифт для кириллицы: {self.font_path}")
+        print(f"Доступные классы: {list(self.model.names.values())}")
+    
+    def _find_cyrillic_font(self):
+        """Поиск шрифта, поддерживающего кириллицу"""
+        return _find_cyrillic_font()
+    
+    def _load_image(self, source, max_side=0):
+        """
+        Загрузка изображения
+        
+        Args:
+            source: Путь к файлу, закодированные байты (JPEG/PNG)
+                    или уже декодированный массив BGR
+            max_side (int): Если задан, байты JPEG декодируются сразу
+                            в уменьшенном размере (не меньше max_side)
+        
+        Returns:
+            np.array: Изображение в формате BGR
+        """
+        # Уже декодированное изображение используем как есть
+        if isinstance(source, np.ndarray):
+            return source
+        
+        # Байты декодируем в памяти, без временных файлов
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            image = cv2.imdecode(
+                np.frombuffer(source, np.uint8), self._decode_flag(source, max_side)
+            )
+            if image is None:
+                raise ValueError("Не удалось декодировать изображение")
+            return image
+        
+        # Проверяем существование файла
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Файл не найден: {source}")
+        
+        # Загружаем изображение
+        image = cv2.imread(source)
+        if image is None:
+            raise ValueError(f"Не удалось загрузить изображение: {source}")
+        
+        return image
+    
+    @staticmethod
+    def _decode_flag(data, max_side):
+        """
+        Флаг декодирования с уменьшением в 2/4/8 раз
+        
+        Для JPEG уменьшение выполняется самим декодером (масштабирование DCT),
+        поэтому многомегапиксельное фото не разворачивается в полный размер.
+        Размер берётся из заголовка без декодирования изображения.
+        """
+        if not max_side:
+            return cv2.IMREAD_COLOR
+        try:
+            largest = max(Image.open(BytesIO(data)).size)
+        except Exception:
+            return cv2.IMREAD_COLOR
+        
+        for factor, flag in (
+            (8, cv2.IMREAD_REDUCED_COLOR_8),
+            (4, cv2.IMREAD_REDUCED_COLOR_4),
+            (2, cv2.IMREAD_REDUCED_COLOR_2),
+        ):
+            if largest // factor >= max_side:
+                return flag
+        return cv2.IMREAD_COLOR
+    
+    @staticmethod
+    def _resize_max(image, max_side):
+        """Уменьшение изображения до max_side по большей стороне"""
+        height, width = image.shape[:2]
+        if not max_side or max(height, width) <= max_side:
+            return image
+        scale = max_side / max(height, width)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    
+    def _prepare_image(self, source):
+        """
+        Предобработка: быстрое декодирование и уменьшение до размера вывода
+        
+        Returns:
+            np.array: Изображение BGR не больше output_max_side
+        """
+        target = max(self.output_max_side, self.imgsz) if self.output_max_side else 0
+        image = self._load_image(source, max_side=target)
+        return self._resize_max(image, self.output_max_side)
+    
+    @staticmethod
+    def _source_name(source):
+        """Подпись источника изображения для отчёта"""
+        return source if isinstance(source, str) else "<в памяти>"
+    
+    @staticmethod
+    def encode_jpeg(image, quality=85):
+        """
+        Кодирование изображения в JPEG
+        
+        Args:
+            image (np.array): Изображение в формате BGR
+            quality (int): Качество JPEG
+            
+        Returns:
+            bytes: Закодированное изображение
+        """
+        success, buffer = cv2.imencode(
+            '.jpg', image,
+            [int(cv2.IMWRITE_JPEG_QUALITY), quality, int(cv2.IMWRITE_JPEG_OPTIMIZE), 1]
+        )
+        if not success:
+            raise ValueError("Не удалось закодировать изображение в JPEG")
+        return buffer.tobytes()
+    
+    def _parse_result(self, result, image_path, image, scale=1.0):
+        """
+        Разбор результата YOLO для одного изображения
+        
+        scale переводит координаты из уменьшенного входа модели
+        в систему координат image.
+        """
+        boxes = result.boxes
+        count = 0 if boxes is None else len(boxes)
+        records = np.zeros(count, dtype=DETECTION_DTYPE)
+        
+        if count:
+            # Переносим тензоры в NumPy один раз на изображение, а не на рамку
+            xyxy = boxes.xyxy.cpu().numpy() * scale
+            records['class_id'] = boxes.cls.cpu().numpy()
+            records['confidence'] = boxes.conf.cpu().numpy()
+            records['bbox'] = xyxy
+            records['area'] = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+        
+        detected_objects = Detections(records, self.model.names, self.ppe_classes)
+        
+        return {
+            'image_path': self._source_name(image_path),
+            'image_shape': image.shape,
+            'detected_objects': detected_objects,
+            'total_detections': len(detected_objects)
+        }
+    
+    def warm_up(self, size=None):
+        """
+        Прогрев модели пустым изображением
+        
+        Первый вызов YOLO инициализирует граф и буферы, поэтому без
+        прогрева первый настоящий анализ заметно медленнее остальных.
+        
+        Returns:
+            float: Время прогрева в секундах
+        """
+        started = time.perf_counter()
+        size = size or self.imgsz
+        dummy = np.zeros((size, size, 3), dtype=np.uint8)
+        self.model(dummy, conf=self.confidence_threshold, imgsz=self.imgsz, verbose=False)
+        return time.perf_counter() - started
+    
+    def detect_objects(self, image):
+        """
+        Детекция объектов на фотографии
+        
+        Args:
+            image: Путь к изображению, байты или массив BGR
+            
+        Returns:
+            dict: Результаты детекции
+        """
+        return self.detect_batch([image])[0]
+    
+    def detect_batch(self, images):
+        """
+        Детекция объектов сразу на нескольких фотографиях
+        
+        Все изображения передаются в модель одним вызовом, поэтому
+        накладные расходы на вызов делятся между фотографиями.
+        
+        Args:
+            images (list): Пути к изображениям, байты или массивы BGR
+            
+        Returns:
+            list: Результаты детекции в порядке входных изображений.
+                  Координаты рамок - в изображении, уменьшенном
+                  до output_max_side
+        """
+        decoded = [self._prepare_image(image) for image in images]
+        return self._detect_images(images, decoded)
+    
+    def _detect_images(self, sources, images):
+        """Детекция на уже декодированных изображениях"""
+        if not images:
+            return []
+        
+        # Уменьшаем до размера входа модели один раз - модели остаётся
+        # только дополнить изображение до квадрата
+        inputs = [self._resize_max(image, self.imgsz) for image in images]
+        
+        # Выполняем детекцию одним вызовом модели
+        results = self.model(inputs, conf=self.confidence_threshold, imgsz=self.imgsz)
+        
+        return [
+            self._parse_result(
+                result, source, image, image.shape[1] / model_input.shape[1]
+            )
+            for result, source, image, model_input in zip(
+                results, sources, images, inputs
+            )
+        ]
+    
+    def analyze_safety_compliance(self, detections):
+        """
+        Анализ соблюдения требований безопасности на основе нарушений
+        """
+        detected = detections['detected_objects']
+        if isinstance(detected, Detections):
+            violations = detected.of_classes(lambda name: name.startswith("NO-"))
+        else:
+            violations = [obj for obj in detected if obj['class'].startswith("NO-")]
+
+        analysis = {
+            'total_violations': len(violations),
+            'violations_details': violations,
+            'safety_status': 'Нарушений СИЗ не обнаружено' if len(violations) == 0 else 'Обнаружены нарушения СИЗ',
+            'recommendations': []
+        }
+
+        if violations:
+            for v in violations:
+                analysis['recommendations'].append(f"Нарушение: {v['class_ru']}")
+
+        return analysis
+
+    def _get_font(self, size):
+        """Шрифт нужного размера (загружается один раз на детектор)"""
+        font = self._fonts.get(size)
+        if font is None:
+            try:
+                if self.font_path:
+                    font = ImageFont.truetype(self.font_path, size)
+                else:
+                    font = ImageFont.load_default()
+            except Exception:
+                font = ImageFont.load_default()
+            self._fonts[size] = font
+        return font
+    
+    def _label_patch(self, label, color):
+        """
+        Готовая плашка подписи (фон + текст) в формате BGR
+        
+        Подписи повторяются (класс + уверенность с точностью до сотых),
+        поэтому отрисовка текста через PIL выполняется один раз на подпись.
+        """
+        key = (label, color)
+        patch = self._label_patches.get(key)
+        if patch is None:
+            font = self._get_font(16)
+            
+            # Получаем размер текста
+            try:
+                bbox = font.getbbox(label)
+                text_width = bbox[2] - bbox[0]
+                text_height = bbox[3] - bbox[1]
+            except AttributeError:
+                # Для старых версий PIL
+                text_width, text_height = font.getsize(label)
+            
+            # Фон и текст подписи
+            pil_patch = Image.new('RGB', (text_width + 10, text_height + 10), color)
+            ImageDraw.Draw(pil_patch).text((5, 5), label, fill='white', font=font)
+            patch = cv2.cvtColor(np.asarray(pil_patch), cv2.COLOR_RGB2BGR)
+            
+            if len(self._label_patches) >= self.LABEL_CACHE_SIZE:
+                self._label_patches.clear()
+            self._label_patches[key] = patch
+        return patch
+    
+    def _annotate(self, image, detections):
+        """Отрисовка детекций прямо на массиве BGR (изменяет image)"""
+        height, width = image.shape[:2]
+        
+        # Отрисовываем все детекции
+        for obj in detections['detected_objects']:
+            x1, y1, x2, y2 = obj['bbox']
+            class_name = obj['class']
+            
+            # Определяем цвет (RGB для подписи, BGR для OpenCV)
+            color = self.colors.get(class_name, self.colors['unknown'])
+            
+            # Рисуем прямоугольник
+            cv2.rectangle(image, (x1, y1), (x2, y2), color[::-1], 3)
+            
+            # Накладываем подпись над рамкой с обрезкой по краям изображения
+            label = f"{obj['class_ru']}: {obj['confidence']:.2f}"
+            patch = self._label_patch(label, color)
+            top = y1 - patch.shape[0]
+            px1, py1 = max(x1, 0), max(top, 0)
+            px2 = min(x1 + patch.shape[1], width)
+            py2 = min(y1, height)
+            if px1 < px2 and py1 < py2:
+                image[py1:py2, px1:px2] = patch[py1 - top:py2 - top, px1 - x1:px2 - x1]
+        
+        return image
+    
+    def draw_detections(self, image, detections, analysis):
+        """
+        Отрисовка результатов детекции на изображении с поддержкой кириллицы
+        
+        Args:
+            image: Исходное изображение (массив BGR, байты или путь)
+            detections: Результаты детекции
+            analysis: Анализ безопасности
+            
+        Returns:
+            np.array: Изображение с отмеченными объектами
+        """
+        # Переданный массив не изменяем - рисуем на копии
+        if isinstance(image, np.ndarray):
+            image = image.copy()
+        else:
+            # Координаты детекций заданы для уменьшенного изображения
+            image = self._prepare_image(image)
+        
+        return self._annotate(image, detections)
+    
+    def _draw_info_panel_pil(self, draw, image_size, analysis, font_large, font_medium, font_small):
+        """Отрисовка информационной панели с помощью PIL"""
+        width, height = image_size
+        
+        # Размеры панели
+        panel_width = 450
+        panel_height = 120
+        panel_x = width - panel_width - 10
+        panel_y = 10
+        
+        # Рисуем фон панели
+        draw.rectangle([panel_x, panel_y, panel_x + panel_width, panel_y + panel_height], 
+                      fill=(0, 0, 0), outline=(255, 255, 255), width=2)
+        
+        # Текст панели
+        y_offset = panel_y + 15
+        
+        # Заголовок
+        draw.text((panel_x + 10, y_offset), "АНАЛИЗ БЕЗОПАСНОСТИ", 
+                 fill=(0, 255, 255), font=font_medium)
+        
+        y_offset += 25
+        
+        # Количество нарушений
+        draw.text((panel_x + 10, y_offset), f"Нарушений: {analysis['total_violations']}", 
+                 fill=(255, 255, 255), font=font_small)
+        
+        y_offset += 20
+        
+        # Статус
+        status_color = (0, 255, 0) if analysis['total_violations'] == 0 else (255, 0, 0)
+        status_text = f"Статус: {analysis['safety_status'][:25]}"
+        if len(analysis['safety_status']) > 25:
+            status_text += "..."
+        
+        draw.text((panel_x + 10, y_offset), status_text, 
+                 fill=status_color, font=font_small)
+        
+        y_offset += 20
+        
+        # Рекомендации (первая)
+        if analysis['recommendations']:
+            rec_text = analysis['recommendations'][0][:35]
+            if len(analysis['recommendations'][0]) > 35:
+                rec_text += "..."
+            draw.text((panel_x + 10, y_offset), rec_text, 
+                     fill=(255, 255, 0), font=font_small)
+        
+        y_offset += 15
+        
+        # Напоминание
+        draw.text((panel_x + 10, y_offset), "Автоматическая проверка СИЗ", 
+                 fill=(0, 255, 255), font=font_small)
+    
+    def process_photo(self, image, output_path=None):
+        """
+        Полная обработка фотографии
+        
+        Args:
+            image: Путь к изображению, байты или массив BGR
+            output_path (str): Путь для сохранения результата (опционально)
+            
+        Returns:
+            tuple: (результат_в_JPEG, детекции, анализ)
+        """
+        return self.process_batch([image], [output_path])[0]
+    
+    def process_batch(self, images, output_paths=None):
+        """
+        Полная обработка нескольких фотографий одним вызовом модели
+        
+        Изображение декодируется один раз, результат кодируется в JPEG
+        в памяти - диск используется только если передан output_path.
+        
+        Args:
+            images (list): Пути к изображениям, байты или массивы BGR
+            output_paths (list): Пути для сохранения результатов (опционально)
+            
+        Returns:
+            list: (результат_в_JPEG, детекции, анализ) для каждого фото,
+                  (None, None, None) для фото, которые не удалось обработать
+        """
+        if output_paths is None:
+            output_paths = [None] * len(images)
+        
+        results = [(None, None, None)] * len(images)
+        
+        # Отбрасываем фото, которые не удалось прочитать, чтобы
+        # одно битое изображение не ломало весь батч
+        valid = []
+        decoded = []
+        for i, source in enumerate(images):
+            print(f"Обработка изображения: {self._source_name(source)}")
+            try:
+                decoded.append(self._prepare_image(source))
+                valid.append(i)
+            except Exception as e:
+                print(f"Ошибка обработки: {str(e)}")
+        
+        try:
+            # Детекция объектов
+            batch_detections = self._detect_images(
+                [images[i] for i in valid], decoded
+            )
+        except Exception as e:
+            print(f"Ошибка обработки: {str(e)}")
+            return results
+        
+        for i, image, detections in zip(valid, decoded, batch_detections):
+            try:
+                # Анализ безопасности
+                analysis = self.analyze_safety_compliance(detections)
+                
+                # Отрисовка результатов прямо на декодированном изображении
+                result_image = self._annotate(image, detections)
+                result_jpeg = self.encode_jpeg(result_image, self.output_quality)
+                
+                # Сохранение результата
+                output_path = output_paths[i]
+                if output_path:
+                    with open(output_path, 'wb') as f:
+                        f.write(result_jpeg)
+                    print(f"Результат сохранен: {output_path}")
+                
+                # Вывод отчета
+                self._print_report(detections, analysis)
+                
+                results[i] = (result_jpeg, detections, analysis)
+                
+            except Exception as e:
+                print(f"Ошибка обработки: {str(e)}")
+        
+        return results
+    
+    def _print_report(self, detections, analysis):
+        """Вывод текстового отчета"""
+        print("\n" + "="*60)
+        print("ОТЧЕТ ПО ДЕТЕКЦИИ СИЗ НА ФОТО")
+        print("="*60)
+        
+        print(f"Изображение: {detections['image_path']}")
+        print(f"Размер: {detections['image_shape'][1]}x{detections['image_shape'][0]} пикселей")
+        print(f"Всего обнаружено объектов: {detections['total_detections']}")
+        
+        if detections['detected_objects']:
+            print("\nДетали обнаруженных объектов:")
+            for i, obj in enumerate(detections['detected_objects'], 1):
+                print(f"  {i}. {obj['class_ru']} (уверенность: {obj['confidence']:.2f})")
+        
+        print(f"\nСтатус безопасности: {analysis['safety_status']}")
+        
+        if analysis['recommendations']:
+            print("\nРекомендации:")
+            for rec in analysis['recommendations']:
+                print(f"  • {rec}")
+        
+        print("="*60)
+
+
+# Реестр детекторов процесса: модель загружается один раз при первом обращении
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+def get_detector(model_path='yolo11n.pt', confidence_threshold=0.5, backend='pytorch',
+                 **options):
+    """
+    Получить общий для процесса детектор
+    
+    Args:
+        model_path (str): Путь к модели YOLO
+        confidence_threshold (float): Порог уверенности для детекции
+        backend (str): Бэкенд инференса
+        **options: imgsz, output_max_side, output_quality
+        
+    Returns:
+        PPEPhotoDetector: Детектор, созданный при первом обращении
+    """
+    key = (model_path, confidence_threshold, backend, tuple(sorted(options.items())))
+    detector = _detectors.get(key)
+    if detector is None:
+        with _detectors_lock:
+            detector = _detectors.get(key)
+            if detector is None:
+                detector = PPEPhotoDetector(
+                    model_path=model_path,
+                    confidence_threshold=confidence_threshold,
+                    backend=backend,
+                    **options,
+                )
+                _detectors[key] = detector
+    return detector
+
+
+def export_model(model_path='yolo11n.pt', backend='onnx', imgsz=640):
+    """
+    Экспорт модели PyTorch в оптимизированный для CPU формат
+    
+    Модель экспортируется с динамическим размером батча, чтобы
+    работал батчевый инференс из пула.
+    
+    Args:
+        model_path (str): Путь к исходной модели (.pt)
+        backend (str): onnx или openvino
+        imgsz (int): Размер входа модели
+        
+    Returns:
+        str: Путь к полученному артефакту
+    """
+    if not BACKENDS.get(backend):
+        raise ValueError(f"Бэкенд {backend} не требует экспорта")
+    
+    from ultralytics import YOLO
+    
+    return YOLO(model_path).export(
+        format=BACKENDS[backend], imgsz=imgsz, dynamic=True, device='cpu'
+    )
+
+
+def _iou(a, b):
+    """IoU двух рамок [x1, y1, x2, y2]"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def check_parity(images, model_path='yolo11n.pt', backend='onnx',
+                 confidence_threshold=0.5, iou_threshold=0.5):
+    """
+    Сравнение детекций бэкенда с эталонной моделью PyTorch
+    
+    Рамки сопоставляются по классу и IoU. Несопоставленные рамки
+    и расхождение уверенности показывают, насколько бэкенд
+    отличается от исходной модели.
+    
+    Args:
+        images (list): Пути к изображениям, байты или массивы BGR
+        model_path (str): Путь к исходной модели (.pt)
+        backend (str): Проверяемый бэкенд
+        confidence_threshold (float): Порог уверенности для детекции
+        iou_threshold (float): Минимальный IoU для совпадения рамок
+        
+    Returns:
+        dict: Итоги сравнения и время инференса обоих бэкендов
+    """
+    reference = PPEPhotoDetector(model_path, confidence_threshold, 'pytorch')
+    candidate = PPEPhotoDetector(model_path, confidence_threshold, backend)
+    reference.warm_up()
+    candidate.warm_up()
+    
+    started = time.perf_counter()
+    expected = reference.detect_batch(images)
+    reference_time = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    actual = candidate.detect_batch(images)
+    candidate_time = time.perf_counter() - started
+    
+    matched = 0
+    unmatched = 0
+    max_confidence_delta = 0.0
+    for exp, act in zip(expected, actual):
+        remaining = list(act['detected_objects'])
+        for obj in exp['detected_objects']:
+            best = max(
+                (o for o in remaining if o['class'] == obj['class']),
+                key=lambda o: _iou(o['bbox'], obj['bbox']),
+                default=None,
+            )
+            if best is not None and _iou(best['bbox'], obj['bbox']) >= iou_threshold:
+                remaining.remove(best)
+                matched += 1
+                max_confidence_delta = max(
+                    max_confidence_delta, abs(best['confidence'] - obj['confidence'])
+                )
+            else:
+                unmatched += 1
+        unmatched += len(remaining)
+    
+    return {
+        'backend': backend,
+        'images': len(images),
+        'matched': matched,
+        'unmatched': unmatched,
+        'max_confidence_delta': max_confidence_delta,
+        'reference_time': reference_time,
+        'candidate_time': candidate_time,
+    }
@@ -0,0 +1,43 @@
+"""
+Точка входа процессов пула инференса СИЗ
+
+Модуль нарочно лежит вне пакета bot: процесс, запущенный через spawn,
+импортирует модуль функции-инициализатора, и импорт через bot потянул
+бы aiogram, обработчики и Django. Здесь загружаются только cv2, numpy
+и модель.
+"""
+import os
+
+
+# Детектор, загруженный в конкретном процессе пула
+_worker_detector = None
+
+
+def init_worker(model_path, confidence_threshold, backend, options, threads):
+    """Инициализация процесса пула: загружаем модель один раз на процесс"""
+    global _worker_detector
+
+    # Не даём каждому процессу занимать все ядра под потоки torch
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from ppe.object_detection import get_detector
+
+    _worker_detector = get_detector(
+        model_path, confidence_threshold, backend, **options
+    )
+    _worker_detector.warm_up()
+
+
+def ping():
+    """Пустая задача: дожидается инициализации процесса пула"""
+    return os.getpid()
+
+
+def process_batch(images, output_paths):
+    """Обработка батча фотографий в процессе пула"""
+    return _worker_detector.process_batch(images, output_paths)
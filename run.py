@@ -1,5 +1,18 @@
-from bot import start_bot
+import argparse
 import asyncio
 
 if __name__ == "__main__":
-    asyncio.run(start_bot())
+    # Импорт под условием: процессы пула инференса (spawn) заново
+    # импортируют главный модуль и не должны загружать бота
+    from bot import start_bot, start_webhook
+
+    parser = argparse.ArgumentParser(description="Запуск бота")
+    parser.add_argument(
+        "--mode",
+        choices=("polling", "webhook"),
+        default="polling",
+        help="long polling или aiohttp-сервер webhook (настройки WEBHOOK_*)",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(start_webhook() if args.mode == "webhook" else start_bot())
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Внешний Django-проект в тестах заменяют заглушки users и orders
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "django_stub"))
+os.environ["DJANGO_SETTINGS_MODULE"] = "stub_settings"
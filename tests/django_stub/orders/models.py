@@ -0,0 +1,44 @@
+from django.db import models
+
+from users.models import Employee
+
+
+class Document(models.Model):
+    """Заглушка наряда-допуска: только поля, которые читает бот"""
+
+    CHOICES = [("a", "A"), ("b", "B")]
+
+    document_number = models.CharField(max_length=64, unique=True)
+    branch = models.CharField(max_length=8, choices=CHOICES, default="a")
+    department = models.CharField(max_length=8, choices=CHOICES, default="a")
+    work_type = models.CharField(max_length=8, choices=CHOICES, default="a")
+    task_description = models.TextField(blank=True)
+    start_datetime = models.DateTimeField()
+    end_datetime = models.DateTimeField()
+    status = models.CharField(
+        max_length=16,
+        choices=[("pending", "Действующий"), ("closed", "Закрыт")],
+        default="pending",
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    supervisor = models.ForeignKey(
+        Employee, models.SET_NULL, null=True, related_name="+"
+    )
+    approver = models.ForeignKey(Employee, models.SET_NULL, null=True, related_name="+")
+    executor = models.ForeignKey(Employee, models.SET_NULL, null=True, related_name="+")
+    observer = models.ForeignKey(Employee, models.SET_NULL, null=True, related_name="+")
+    crew_members = models.ManyToManyField(Employee, related_name="+")
+    file = models.FileField(blank=True)
+
+
+class DocumentPhoto(models.Model):
+    """Заглушка фотографии работ"""
+
+    document = models.ForeignKey(Document, models.CASCADE, related_name="photos")
+    photo_type = models.CharField(max_length=16)
+    uploaded_by = models.ForeignKey(Employee, models.SET_NULL, null=True)
+    file_id = models.CharField(max_length=255)
+    file_unique_id = models.CharField(max_length=64, null=True, unique=True)
+    photo = models.FileField(blank=True)
+    ppe_result = models.JSONField(null=True, blank=True)
+    ppe_image = models.FileField(upload_to="ppe_results/", null=True, blank=True)
@@ -0,0 +1,12 @@
+# Настройки Django для тестов: вместо внешнего проекта documenthelper
+# подключаются заглушки приложений users и orders
+SECRET_KEY = "tests"
+USE_TZ = True
+INSTALLED_APPS = ["users", "orders"]
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    }
+}
+DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
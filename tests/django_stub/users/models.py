@@ -0,0 +1,11 @@
+import uuid
+
+from django.db import models
+
+
+class Employee(models.Model):
+    """Заглушка сотрудника: только поля, которые читает бот"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    telegram_id = models.BigIntegerField(null=True, unique=True)
+    full_name = models.CharField(max_length=255)
@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.handlers.user import orders, ppe_results
+from bot.handlers.user.ppe_cache import PPEResultCache
+
+
+def _analysis(status):
+    return {"safety_status": status}
+
+
+def test_cached_document_is_analysed_without_telegram(tmp_path, monkeypatch):
+    cache = PPEResultCache(path=str(tmp_path / "ppe.sqlite3"), model_version="v1")
+    monkeypatch.setattr(ppe_results, "ppe_cache", cache)
+    monkeypatch.setattr(orders, "ppe_cache", cache)
+
+    async def get_file(file_id):
+        raise AssertionError("getFile for a cached photo")
+
+    callback = SimpleNamespace(bot=SimpleNamespace(get_file=get_file))
+    photos = [
+        {"file_id": "f-1", "file_unique_id": "u-1"},
+        # Тот же снимок, проанализированный под другим file_id
+        {"file_id": "f-2", "file_unique_id": "u-2"},
+    ]
+
+    async def scenario():
+        await cache.put("u-1", [], _analysis("ok"), b"jpeg-1", file_id="f-1")
+        await cache.put("u-2", [], _analysis("bad"), b"jpeg-2", file_id="f-old")
+        return await orders._analyze_photos(callback, photos)
+
+    verdicts, media_group, cache_keys = asyncio.run(scenario())
+
+    assert verdicts == ["ok", "bad"]
+    assert len(media_group) == 2
+    assert cache_keys == [("f-1", "u-1"), ("f-2", "u-2")]
+
+
+def test_cache_lookup_is_one_query(tmp_path):
+    cache = PPEResultCache(path=str(tmp_path / "ppe.sqlite3"), model_version="v1")
+    statements = []
+
+    async def scenario():
+        await cache.put("u-1", [], _analysis("ok"), b"jpeg", file_id="f-1")
+        connection = cache._db.connect()
+        connection.set_trace_callback(statements.append)
+        found = await cache.get_many(
+            [{"file_id": f"f-{i}", "file_unique_id": f"u-{i}"} for i in range(10)]
+        )
+        connection.set_trace_callback(None)
+        return found
+
+    found = asyncio.run(scenario())
+
+    assert list(found) == ["f-1"]
+    assert sum(sql.startswith("SELECT") for sql in statements) == 1
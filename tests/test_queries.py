@@ -0,0 +1,178 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bot.database.methods import create
+from bot.database.methods.get import _collect_active_documents, _load_ppe_results
+from bot.database.methods.update import (
+    _store_ppe_result,
+    _store_ppe_result_file_id,
+)
+from orders.models import Document, DocumentPhoto
+from users.models import Employee
+
+
+@pytest.fixture(scope="module")
+def employee():
+    call_command("migrate", run_syncdb=True, verbosity=0)
+
+    employee = Employee.objects.create(telegram_id=1, full_name="Иванов И.И.")
+    crew = [Employee.objects.create(full_name=f"Член бригады {i}") for i in range(3)]
+    now = timezone.now()
+    for i in range(5):
+        document = Document.objects.create(
+            document_number=f"N-{i}",
+            start_datetime=now,
+            end_datetime=now + timedelta(hours=8),
+            supervisor=employee,
+            executor=employee if i % 2 else crew[0],
+            approver=crew[1],
+            observer=crew[2],
+        )
+        document.crew_members.set(crew)
+    return employee
+
+
+def test_active_documents_query_count(employee):
+    # Документы с участниками - один запрос, бригады всех документов - второй
+    with CaptureQueriesContext(connection) as queries:
+        documents = _collect_active_documents.__wrapped__(employee)
+
+    assert len(documents) == 5
+    assert len(queries) == 2
+    assert all(len(doc["participants"]["crew_members"]) == 3 for doc in documents)
+
+
+def test_ppe_result_is_read_from_the_photo_row(employee, tmp_path):
+    document = Document.objects.get(document_number="N-0")
+    DocumentPhoto.objects.create(
+        document=document, photo_type="start", uploaded_by=employee, file_id="ppe-1"
+    )
+    load = _load_ppe_results.__wrapped__
+
+    with override_settings(MEDIA_ROOT=str(tmp_path)):
+        result = {
+            "file_unique_id": "u-ppe-1",
+            "model_version": "v1",
+            "threshold": 0.4,
+            "detections": [{"class": "helmet"}],
+            "analysis": {"safety_status": "ok"},
+            "result_file_id": None,
+        }
+        _store_ppe_result.__wrapped__("ppe-1", result, b"jpeg")
+
+        stored = load(["ppe-1", "ppe-2"], "v1", 0.4)
+        assert stored["ppe-1"]["image"] == b"jpeg"
+        assert stored["ppe-1"]["analysis"] == {"safety_status": "ok"}
+        # Результат другой модели не выдаётся
+        assert load(["ppe-1"], "v2", 0.4) == {}
+
+        _store_ppe_result_file_id.__wrapped__("ppe-1", "v1", 0.4, "sent-1")
+        stored = load(["ppe-1"], "v1", 0.4)
+        assert stored["ppe-1"]["result_file_id"] == "sent-1"
+        assert stored["ppe-1"]["image"] is None
+
+
+def _claim(photos):
+    return create._claim_document_photos.__wrapped__(photos, "N-1", "start", 1, "jpg")
+
+
+def _race_on_reserve(monkeypatch, employee, file_unique_id):
+    """Параллельная загрузка записывает фото между проверкой и INSERT"""
+    reserve = create._reserve_storage_name
+
+    def reserve_after_race(photo, filename):
+        if photo.file_unique_id == file_unique_id:
+            DocumentPhoto.objects.create(
+                document=photo.document,
+                photo_type="start",
+                uploaded_by=employee,
+                file_id=f"other-{file_unique_id}",
+                file_unique_id=file_unique_id,
+            )
+        return reserve(photo, filename)
+
+    monkeypatch.setattr(create, "_reserve_storage_name", reserve_after_race)
+
+
+def test_claim_skips_duplicates_in_album(employee, tmp_path):
+    with override_settings(MEDIA_ROOT=str(tmp_path)):
+        claimed = _claim([("a-1", "ua-1"), ("a-2", "ua-1"), ("a-3", "ua-3")])
+
+    assert [photo.file_unique_id for photo, _, _ in claimed] == ["ua-1", "ua-3"]
+    assert all(photo.pk for photo, _, _ in claimed)
+    # Под каждое новое фото занят пустой файл в хранилище
+    for _, name, path in claimed:
+        assert name and open(path, "rb").read() == b""
+
+
+def test_claim_skips_existing_photos(employee, tmp_path):
+    with override_settings(MEDIA_ROOT=str(tmp_path)):
+        _claim([("e-1", "ue-1")])
+        claimed = _claim([("e-1", "ue-1"), ("e-2", "ue-2")])
+
+    assert [photo.file_unique_id for photo, _, _ in claimed] == ["ue-2"]
+    assert DocumentPhoto.objects.filter(file_unique_id="ue-1").count() == 1
+
+
+def test_claim_falls_back_to_single_inserts_on_conflict(
+    employee, tmp_path, monkeypatch
+):
+    _race_on_reserve(monkeypatch, employee, "ur-1")
+    with override_settings(MEDIA_ROOT=str(tmp_path)):
+        claimed = _claim([("r-1", "ur-1"), ("r-2", "ur-2")])
+        reserved = sorted(p.name for p in tmp_path.iterdir())
+
+    # bulk_create упал на ur-1, альбом вставлен по одному фото
+    assert [photo.file_unique_id for photo, _, _ in claimed] == ["ur-2"]
+    assert DocumentPhoto.objects.get(file_unique_id="ur-1").file_id == "other-ur-1"
+    # Резерв имени проигравшего фото освобождён
+    assert reserved == [claimed[0][1]]
+
+
+def test_claim_owns_only_rows_it_inserted(employee, tmp_path, monkeypatch):
+    # Без RETURNING из bulk_create фото вставляются по одному сразу
+    monkeypatch.setattr(
+        type(connections["default"].features),
+        "can_return_rows_from_bulk_insert",
+        False,
+    )
+    _race_on_reserve(monkeypatch, employee, "uo-1")
+    with override_settings(MEDIA_ROOT=str(tmp_path)):
+        claimed = _claim([("o-1", "uo-1"), ("o-2", "uo-2")])
+
+    assert len(claimed) == 1
+    photo = claimed[0][0]
+    assert photo.file_unique_id == "uo-2"
+    assert DocumentPhoto.objects.get(file_unique_id="uo-2").pk == photo.pk
+    raced = DocumentPhoto.objects.get(file_unique_id="uo-1")
+    assert raced.file_id == "other-uo-1"
+
+
+def test_claim_relies_on_the_unique_constraint(employee, tmp_path):
+    with override_settings(MEDIA_ROOT=str(tmp_path)):
+        with CaptureQueriesContext(connection) as queries:
+            claimed = _claim([("c-1", "uc-1"), ("c-2", "uc-2")])
+
+    assert len(claimed) == 2
+    # Документ, сотрудник и один INSERT - без проверки существующих фото
+    selects = [q["sql"] for q in queries if q["sql"].startswith("SELECT")]
+    assert len(selects) == 2
+    assert not any("orders_documentphoto" in sql for sql in selects)
+
+
+def test_claim_without_unique_field_filters_by_file_id(
+    employee, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(create, "_HAS_FILE_UNIQUE_ID", False)
+    with override_settings(MEDIA_ROOT=str(tmp_path)):
+        _claim([("f-1", None)])
+        claimed = _claim([("f-1", None), ("f-2", None)])
+
+    assert [photo.file_id for photo, _, _ in claimed] == ["f-2"]
+    assert DocumentPhoto.objects.filter(file_id="f-1").count() == 1
@@ -0,0 +1,152 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendMediaGroup, SendMessage
+from aiogram.types import InputMediaPhoto
+
+from bot.misc import rate_limit as module
+from bot.misc.rate_limit import RateLimitMiddleware, TokenBucket
+
+
+def _virtual_clock(monkeypatch):
+    """
+    Часы без реального ожидания: asyncio.sleep сдвигает время
+
+    Returns:
+        list: Длительности всех вызовов sleep
+    """
+    now = [0.0]
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        sleeps.append(delay)
+        await real_sleep(0)
+        now[0] += delay
+
+    monkeypatch.setattr(module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(module.asyncio, "sleep", sleep)
+    return sleeps
+
+
+def _middleware(**kwargs):
+    options = dict(
+        global_rate=30, chat_rate=1, chat_burst=3, group_rate=0.5, retry_attempts=3
+    )
+    options.update(kwargs)
+    return RateLimitMiddleware(**options)
+
+
+def test_bucket_spends_burst_then_follows_rate(monkeypatch):
+    sleeps = _virtual_clock(monkeypatch)
+
+    async def scenario():
+        bucket = TokenBucket(rate=2, capacity=3)
+        for _ in range(5):
+            await bucket.acquire()
+
+    asyncio.run(scenario())
+
+    # Запас из 3 токенов сразу, ещё 2 - по полсекунды
+    assert sleeps == [0.5, 0.5]
+
+
+def test_album_costs_one_token_per_photo(monkeypatch):
+    sleeps = _virtual_clock(monkeypatch)
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append(type(method).__name__)
+        return True
+
+    album = SendMediaGroup(chat_id=1, media=[InputMediaPhoto(media="x")] * 3)
+
+    async def scenario():
+        middleware = _middleware()
+        await middleware(make_request, None, album)
+        # Запас чата израсходован альбомом: сообщение ждёт секунду
+        await middleware(make_request, None, SendMessage(chat_id=1, text="hi"))
+
+    asyncio.run(scenario())
+
+    assert sent == ["SendMediaGroup", "SendMessage"]
+    assert sleeps == [1.0]
+
+
+def test_retry_after_pauses_chat_and_global_buckets(monkeypatch):
+    sleeps = _virtual_clock(monkeypatch)
+    sent = []
+
+    async def scenario():
+        middleware = _middleware()
+        flooded = asyncio.Event()
+
+        async def make_request(bot, method):
+            if method.chat_id == 1 and not flooded.is_set():
+                flooded.set()
+                raise TelegramRetryAfter(method, "Flood control", retry_after=5)
+            sent.append(method.chat_id)
+            return True
+
+        async def other_chat():
+            # Запрос в другой чат во время паузы после flood control
+            await flooded.wait()
+            await middleware(make_request, None, SendMessage(chat_id=2, text="b"))
+
+        await asyncio.gather(
+            middleware(make_request, None, SendMessage(chat_id=1, text="a")),
+            other_chat(),
+        )
+        return middleware
+
+    middleware = asyncio.run(scenario())
+
+    assert sorted(sent) == [1, 2]
+    # Первым ждёт повтор, другой чат - общее ведро не меньше retry_after
+    assert sleeps[0] == 5
+    assert len(sleeps) == 2 and sleeps[1] >= 5
+    # Ведро чата тоже на паузе
+    assert middleware._chats[1]._tokens < 0
+
+
+def test_retry_after_gives_up_after_attempts(monkeypatch):
+    _virtual_clock(monkeypatch)
+
+    async def make_request(bot, method):
+        raise TelegramRetryAfter(method, "Flood control", retry_after=1)
+
+    async def scenario():
+        middleware = _middleware(retry_attempts=2)
+        try:
+            await middleware(make_request, None, SendMessage(chat_id=1, text="a"))
+        except TelegramRetryAfter:
+            return "raised"
+
+    assert asyncio.run(scenario()) == "raised"
+
+
+def test_waiting_edits_of_one_message_are_coalesced(monkeypatch):
+    _virtual_clock(monkeypatch)
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append(method.text)
+        return method.text
+
+    def edit(text, message_id=10):
+        return EditMessageText(chat_id=1, message_id=message_id, text=text)
+
+    async def scenario():
+        middleware = _middleware()
+        return await asyncio.gather(
+            middleware(make_request, None, edit("v1")),
+            middleware(make_request, None, edit("v2")),
+            middleware(make_request, None, edit("other", message_id=11)),
+        )
+
+    results = asyncio.run(scenario())
+
+    # Ждавшая правка заменена новой, оба вызова получили её результат
+    assert results == ["v2", "v2", "other"]
+    assert sorted(sent) == ["other", "v2"]
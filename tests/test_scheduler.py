@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.middleware import SchedulerMiddleware
+
+
+def _data(chat_id):
+    return {
+        "event_chat": SimpleNamespace(id=chat_id),
+        "event_from_user": SimpleNamespace(id=chat_id),
+    }
+
+
+def test_light_update_passes_busy_heavy_lane_and_spamming_chat():
+    async def scenario():
+        scheduler = SchedulerMiddleware(
+            max_concurrent=8,
+            max_heavy=2,
+            max_chat_queue=4,
+            is_heavy=lambda event: event == "heavy",
+        )
+        # Как tasks_concurrency_limit в aiogram: слот берётся до создания задачи
+        admitted = asyncio.Semaphore(64)
+        release = asyncio.Event()
+
+        async def blocked(event, data):
+            await release.wait()
+
+        async def light(event, data):
+            return "done"
+
+        async def feed(handler, event, data):
+            async with admitted:
+                return await scheduler(handler, event, data)
+
+        def start(handler, event, data):
+            return asyncio.create_task(feed(handler, event, data))
+
+        # Тяжёлые апдейты 40 чатов: 2 выполняются, остальные ждут полосу
+        tasks = [start(blocked, "heavy", _data(chat)) for chat in range(40)]
+        # Один чат засыпает бота лёгкими апдейтами
+        tasks += [start(blocked, "light", _data(1000)) for _ in range(100)]
+        await asyncio.sleep(0.05)
+
+        result = await asyncio.wait_for(feed(light, "light", _data(2000)), timeout=1)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        return result
+
+    assert asyncio.run(scenario()) == "done"
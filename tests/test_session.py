@@ -0,0 +1,34 @@
+import asyncio
+
+import aiogram.client.session.aiohttp as aiogram_aiohttp
+from aiohttp import TCPConnector
+
+from bot.misc.session import TunedAiohttpSession
+
+
+def test_proxy_change_keeps_tuned_connector(monkeypatch):
+    # Без aiohttp-socks: прокси-коннектор подменяется обычным, а настройки
+    # собираются заново, как это делает aiogram
+    monkeypatch.setattr(
+        aiogram_aiohttp,
+        "_prepare_connector",
+        lambda proxy: (TCPConnector, {}),
+    )
+
+    async def scenario():
+        session = TunedAiohttpSession(limit=7, keepalive=12, dns_ttl=34)
+        session.proxy = "socks5://127.0.0.1:1080"
+        client = await session.create_session()
+        download = await session.create_download_session()
+        try:
+            return session._connector_init, client.connector, download.connector
+        finally:
+            await session.close()
+
+    init, connector, download_connector = asyncio.run(scenario())
+
+    assert init["keepalive_timeout"] == 12
+    assert init["ttl_dns_cache"] == 34
+    assert connector.limit == 7
+    assert connector._keepalive_timeout == 12
+    assert download_connector._keepalive_timeout == 12
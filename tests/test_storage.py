@@ -0,0 +1,120 @@
+import asyncio
+import threading
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from bot.misc.storage import SQLiteStorage, _create_redis_storage
+
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=20)
+
+
+def test_sqlite_state_and_data(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(path=str(tmp_path / "fsm.sqlite3"))
+        await storage.set_state(KEY, "OrderStates:waiting_photos")
+        await storage.set_data(KEY, {"document_number": "A-1"})
+        data = await storage.update_data(KEY, {"photos_count": 1})
+
+        assert data == {"document_number": "A-1", "photos_count": 1}
+        assert await storage.get_state(KEY) == "OrderStates:waiting_photos"
+
+        # Сброс состояния не трогает данные
+        await storage.set_state(KEY, None)
+        assert await storage.get_state(KEY) is None
+        assert await storage.get_data(KEY) == data
+        await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_survives_restart(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+
+    async def write():
+        storage = SQLiteStorage(path=path)
+        await storage.set_state(KEY, "OrderStates:waiting_photos")
+        await storage.update_data(KEY, {"photos_count": 3})
+        await storage.close()
+
+    async def read():
+        storage = SQLiteStorage(path=path)
+        try:
+            return await storage.get_state(KEY), await storage.get_data(KEY)
+        finally:
+            await storage.close()
+
+    asyncio.run(write())
+    assert asyncio.run(read()) == ("OrderStates:waiting_photos", {"photos_count": 3})
+
+
+def test_sqlite_expired_state_is_empty(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(path=str(tmp_path / "fsm.sqlite3"), ttl=60)
+        await storage.set_state(KEY, "OrderStates:waiting_photos")
+        storage._db.connect().execute("UPDATE fsm_states SET updated = 0")
+
+        assert await storage.get_state(KEY) is None
+        assert await storage.get_data(KEY) == {}
+        await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_concurrent_update_data(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(path=str(tmp_path / "fsm.sqlite3"))
+        await asyncio.gather(
+            *(storage.update_data(KEY, {f"photo_{i}": i}) for i in range(50))
+        )
+        data = await storage.get_data(KEY)
+        await storage.close()
+        return data
+
+    assert asyncio.run(scenario()) == {f"photo_{i}": i for i in range(50)}
+
+
+@pytest.fixture
+def redis_url():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    try:
+        yield f"redis://{host}:{port}/0"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_redis_update_data_from_two_replicas(redis_url):
+    async def scenario():
+        # Две реплики бота с отдельными соединениями к одному серверу
+        replicas = [_create_redis_storage(redis_url, 0) for _ in range(2)]
+        await asyncio.gather(
+            *(
+                replicas[i % 2].update_data(KEY, {f"photo_{i}": i})
+                for i in range(20)
+            )
+        )
+        data = await replicas[0].get_data(KEY)
+        for storage in replicas:
+            await storage.close()
+        return data
+
+    assert asyncio.run(scenario()) == {f"photo_{i}": i for i in range(20)}
+
+
+def test_redis_update_data_keeps_ttl(redis_url):
+    async def scenario():
+        storage = _create_redis_storage(redis_url, 3600)
+        data = await storage.update_data(KEY, {"photos_count": 1})
+        ttl = await storage.redis.ttl(storage.key_builder.build(KEY, "data"))
+        await storage.close()
+        return data, ttl
+
+    data, ttl = asyncio.run(scenario())
+    assert data == {"photos_count": 1}
+    assert 0 < ttl <= 3600
@@ -0,0 +1,146 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.handlers.user import upload_queue as module
+from bot.handlers.user.upload_queue import PhotoUploadQueue
+
+
+SESSION = ("N-1", "start", "token-1")
+
+
+def _photo(pk):
+    return SimpleNamespace(pk=pk, file_id=f"file-{pk}")
+
+
+def _stub_storage(monkeypatch, failures):
+    """Скачивание, которое падает failures[pk] раз, затем проходит"""
+    stored, discarded = [], []
+
+    async def store(bot, photo, filename, storage_path, keep_content=False):
+        if failures.get(photo.pk, 0) > 0:
+            failures[photo.pk] -= 1
+            raise OSError("network")
+        stored.append(photo.pk)
+        return b"jpeg" if keep_content else storage_path
+
+    async def discard(photo):
+        discarded.append(photo.pk)
+
+    monkeypatch.setattr(module, "store_document_photo_file", store)
+    monkeypatch.setattr(module, "discard_document_photo", discard)
+    return stored, discarded
+
+
+def test_upload_retries_then_succeeds(monkeypatch):
+    stored, discarded = _stub_storage(monkeypatch, {1: 2})
+    sources = []
+
+    async def scenario():
+        queue = PhotoUploadQueue(retries=3, retry_delay=0)
+        await queue.submit(
+            None, SESSION, _photo(1), "1.jpg", None, on_stored=sources.append
+        )
+        failed = await queue.wait_session(SESSION)
+        await queue.shutdown(timeout=1)
+        return failed
+
+    assert asyncio.run(scenario()) == 0
+    assert stored == [1] and discarded == []
+    assert sources == [b"jpeg"]
+
+
+def test_upload_discards_photo_when_retries_run_out(monkeypatch):
+    stored, discarded = _stub_storage(monkeypatch, {1: 5})
+
+    async def scenario():
+        queue = PhotoUploadQueue(retries=3, retry_delay=0)
+        await queue.submit(None, SESSION, _photo(1), "1.jpg", None)
+        failed = await queue.wait_session(SESSION)
+        # Счётчик неудач отдаётся один раз
+        again = await queue.wait_session(SESSION)
+        await queue.shutdown(timeout=1)
+        return failed, again
+
+    assert asyncio.run(scenario()) == (1, 0)
+    assert stored == [] and discarded == [1]
+
+
+def test_failures_taken_early_are_not_reported_again(monkeypatch):
+    _stub_storage(monkeypatch, {1: 1})
+
+    async def scenario():
+        queue = PhotoUploadQueue(retries=1, retry_delay=0)
+        await queue.submit(None, SESSION, _photo(1), "1.jpg", None)
+        await queue.submit(None, SESSION, _photo(2), "2.jpg", None)
+        await queue._queue.join()
+        # Следующий альбом забирает неудачи, не дожидаясь загрузок
+        taken = queue.take_failed(SESSION)
+        failed = await queue.wait_session(SESSION)
+        await queue.shutdown(timeout=1)
+        return taken, failed
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+
+def test_failures_stay_in_their_session(monkeypatch):
+    _stub_storage(monkeypatch, {1: 1, 2: 1})
+    start = ("N-1", "start", "token-1")
+    completion = ("N-1", "completion", "token-2")
+
+    async def scenario():
+        queue = PhotoUploadQueue(retries=1, retry_delay=0)
+        await queue.submit(None, start, _photo(1), "1.jpg", None)
+        await queue.submit(None, completion, _photo(2), "2.jpg", None)
+        await queue._queue.join()
+        counts = (queue.take_failed(start), queue.take_failed(completion))
+        await queue.shutdown(timeout=1)
+        return counts
+
+    # Один документ, но сессии (тип фото, метка) считаются отдельно
+    assert asyncio.run(scenario()) == (1, 1)
+
+
+def test_closed_session_does_not_count_late_failures(monkeypatch):
+    stored, discarded = _stub_storage(monkeypatch, {1: 1})
+
+    async def scenario():
+        gate = asyncio.Event()
+        original = module.store_document_photo_file
+
+        async def slow_store(*args, **kwargs):
+            await gate.wait()
+            return await original(*args, **kwargs)
+
+        monkeypatch.setattr(module, "store_document_photo_file", slow_store)
+
+        queue = PhotoUploadQueue(retries=1, retry_delay=0)
+        await queue.submit(None, SESSION, _photo(1), "1.jpg", None)
+        # Пользователь отменил загрузку, пока фото ещё скачивается
+        queue.close(SESSION)
+        gate.set()
+        await queue._queue.join()
+        counts = (queue.take_failed(SESSION), await queue.wait_session(SESSION))
+        await queue.shutdown(timeout=1)
+        return counts
+
+    assert asyncio.run(scenario()) == (0, 0)
+    # Задание доработало: запись без файла удалена
+    assert stored == [] and discarded == [1]
+
+
+def test_failed_counts_are_trimmed(monkeypatch):
+    _stub_storage(monkeypatch, {1: 1, 2: 1, 3: 1})
+
+    async def scenario():
+        queue = PhotoUploadQueue(retries=1, retry_delay=0)
+        queue.FAILED_LIMIT = 2
+        sessions = [(f"N-{pk}", "start", "token") for pk in (1, 2, 3)]
+        for pk, session in zip((1, 2, 3), sessions):
+            await queue.submit(None, session, _photo(pk), f"{pk}.jpg", None)
+        await queue._queue.join()
+        counts = [await queue.wait_session(session) for session in sessions]
+        await queue.shutdown(timeout=1)
+        return counts
+
+    # Неудача самой старой сессии забыта
+    assert asyncio.run(scenario()) == [0, 1, 1]